@@ -0,0 +1,62 @@
+# Compares splicing k section replacements into a fixed-size document by
+# rebuilding the string for every replacement against the Document piece table.
+#
+# Run with: poetry run python benchmarks/splice.py
+
+import timeit
+
+from doteki.cli import Document
+
+DOCUMENT_SIZE = 1_000_000
+SECTION_COUNTS = [1, 10, 100, 1000]
+REPEAT = 5
+
+
+def build_replacements(k: int) -> list[tuple[int, int, str]]:
+    step = DOCUMENT_SIZE // k
+    return [(i * step, i * step + 10, "new content") for i in range(k)]
+
+
+def splice_by_concatenation(
+    content: str, replacements: list[tuple[int, int, str]]
+) -> str:
+    for start_index, end_index, new_content in reversed(replacements):
+        content = content[:start_index] + new_content + content[end_index:]
+    return content
+
+
+def splice_with_document(content: str, replacements: list[tuple[int, int, str]]) -> str:
+    document = Document(content)
+    for start_index, end_index, new_content in replacements:
+        document.replace(start_index, end_index, new_content)
+    return document.render()
+
+
+def main() -> None:
+    content = "x" * DOCUMENT_SIZE
+    print(f"Document size: {DOCUMENT_SIZE:,} characters (best of {REPEAT} runs)\n")
+    print(f"{'sections':>8} {'concatenation':>15} {'document':>12}")
+    for k in SECTION_COUNTS:
+        replacements = build_replacements(k)
+        assert splice_by_concatenation(content, replacements) == splice_with_document(
+            content, replacements
+        )
+        concatenation = min(
+            timeit.repeat(
+                lambda: splice_by_concatenation(content, replacements),
+                number=1,
+                repeat=REPEAT,
+            )
+        )
+        document = min(
+            timeit.repeat(
+                lambda: splice_with_document(content, replacements),
+                number=1,
+                repeat=REPEAT,
+            )
+        )
+        print(f"{k:>8} {concatenation * 1000:>13.2f}ms {document * 1000:>10.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+import time
+from typing import Any, NamedTuple
+
+from doteki.cache import write_json_atomically
+
+BREAKERS_FILE = "breakers.json"
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class BreakerState(NamedTuple):
+    plugin: str
+    endpoint: str
+    failures: int
+    state: str
+    retry_in: float  # Seconds until an open breaker lets a call through.
+
+
+class CircuitBreakers:
+    # Consecutive failures per plugin and upstream endpoint, kept between runs.
+    # After `threshold` failures the breaker opens and calls are skipped until
+    # `cooldown` has passed. Then it's half-open: the next call decides whether
+    # it closes again or stays open for another cooldown.
+    def __init__(self, directory: str, read_only: bool = False):
+        self.path: str = os.path.join(directory, BREAKERS_FILE)
+        self.read_only: bool = read_only
+        self.entries: dict[str, dict[str, Any]] | None = None
+        self.changed: bool = False
+
+    def load(self) -> dict[str, dict[str, Any]]:
+        if self.entries is None:
+            self.entries = {}
+            try:
+                with open(self.path, "r", encoding="utf-8") as file:
+                    entries = json.load(file)
+                if isinstance(entries, dict):
+                    self.entries = entries
+            except FileNotFoundError:
+                pass
+            except (IOError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable breaker state {self.path}: {e}")
+        return self.entries
+
+    def state(self, key: str) -> BreakerState | None:
+        entry = self.load().get(key)
+        if entry is None:
+            return None
+        try:
+            opened = entry["opened"]
+            if opened is None:
+                state, retry_in = CLOSED, 0.0
+            else:
+                retry_in = max(0.0, opened + entry["cooldown"] - time.time())
+                state = OPEN if retry_in else HALF_OPEN
+            return BreakerState(
+                entry["plugin"], entry["endpoint"], entry["failures"], state, retry_in
+            )
+        except (KeyError, TypeError):
+            return None
+
+    def allows(self, key: str) -> bool:
+        breaker_state = self.state(key)
+        return breaker_state is None or breaker_state.state != OPEN
+
+    def record_success(self, key: str) -> None:
+        if self.load().pop(key, None) is not None:
+            self.changed = True
+
+    def record_failure(
+        self,
+        key: str,
+        plugin_name: str,
+        endpoint: str,
+        threshold: int,
+        cooldown: float,
+    ) -> None:
+        breaker_state = self.state(key)
+        failures = breaker_state.failures + 1 if breaker_state else 1
+        opened = None
+        if failures >= threshold:
+            opened = time.time()
+        self.load()[key] = {
+            "plugin": plugin_name,
+            "endpoint": endpoint,
+            "failures": failures,
+            "opened": opened,
+            "cooldown": cooldown,
+        }
+        self.changed = True
+
+    def tripped(self) -> list[BreakerState]:
+        states = (self.state(key) for key in self.load())
+        return [s for s in states if s is not None and s.state != CLOSED]
+
+    def save(self) -> None:
+        if not self.changed or self.entries is None or self.read_only:
+            return
+        try:
+            write_json_atomically(self.path, self.entries)
+            self.changed = False
+        except (IOError, TypeError, ValueError) as e:
+            logging.warning(f"Could not write breaker state {self.path}: {e}")
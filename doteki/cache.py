@@ -0,0 +1,179 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Any, NamedTuple
+
+
+class CacheEntry(NamedTuple):
+    output: Any
+    created: float
+
+    def age(self) -> float:
+        return time.time() - self.created
+
+
+def default_cache_dir() -> str:
+    cache_home = os.getenv("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "doteki")
+
+
+def secrets_fingerprint(plugin_name: str) -> str:
+    # Plugins read secrets from DOTEKI_<PLUGIN_NAME>_* variables. Only a digest of
+    # them goes into cache keys: changing a secret invalidates the cache, but the
+    # value itself never reaches the disk.
+    prefix = f"DOTEKI_{plugin_name.upper()}_"
+    secrets = sorted(
+        f"{name}={value}"
+        for name, value in os.environ.items()
+        if name.startswith(prefix)
+    )
+    return hashlib.sha256("\n".join(secrets).encode()).hexdigest()
+
+
+def cache_key(plugin_name: str, invocation_key: str) -> str:
+    key_material = f"{invocation_key}:{secrets_fingerprint(plugin_name)}"
+    return hashlib.sha256(key_material.encode()).hexdigest()
+
+
+class OutputCache:
+    # Plugin outputs stored as one JSON file per key, so that several processes
+    # can share the same directory. A read-only cache serves entries but never
+    # writes them.
+    def __init__(self, directory: str, read_only: bool = False):
+        self.directory: str = directory
+        self.read_only: bool = read_only
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, "outputs", key[:2], f"{key}.json")
+
+    def get(self, key: str) -> CacheEntry | None:
+        try:
+            with open(self.path(key), "r", encoding="utf-8") as file:
+                entry = json.load(file)
+            return CacheEntry(entry["output"], float(entry["created"]))
+        except FileNotFoundError:
+            return None
+        except (IOError, ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Ignoring unreadable cache entry {self.path(key)}: {e}")
+            return None
+
+    def set(self, key: str, plugin_name: str, output: Any) -> None:
+        if self.read_only:
+            return
+        path = self.path(key)
+        entry = {"plugin": plugin_name, "created": time.time(), "output": output}
+        try:
+            write_json_atomically(path, entry)
+        except (IOError, TypeError, ValueError) as e:
+            logging.warning(f"Could not write cache entry {path}: {e}")
+
+
+class HttpCacheEntry(NamedTuple):
+    headers: dict[str, str]
+    body: bytes
+
+    def validators(self) -> dict[str, str]:
+        validators = {}
+        if "ETag" in self.headers:
+            validators["If-None-Match"] = self.headers["ETag"]
+        if "Last-Modified" in self.headers:
+            validators["If-Modified-Since"] = self.headers["Last-Modified"]
+        return validators
+
+
+class HttpCache:
+    # Response bodies and their validators, one file per URL: a line of JSON
+    # headers followed by the body. URLs are hashed, since some carry API keys.
+    # Entries not used within max_age are dropped, and the least recently used
+    # ones go first when the cache grows beyond max_bytes.
+    def __init__(
+        self, directory: str, max_bytes: int, max_age: float, read_only: bool = False
+    ):
+        self.directory: str = os.path.join(directory, "http")
+        self.max_bytes: int = max_bytes
+        self.max_age: float = max_age
+        self.read_only: bool = read_only
+
+    def path(self, url: str) -> str:
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.directory, key[:2], f"{key}.http")
+
+    def get(self, url: str) -> HttpCacheEntry | None:
+        path = self.path(url)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                return None
+            with open(path, "rb") as file:
+                headers = json.loads(file.readline())
+                body = file.read()
+            return HttpCacheEntry(dict(headers), body)
+        except FileNotFoundError:
+            return None
+        except (IOError, ValueError, TypeError) as e:
+            logging.warning(f"Ignoring unreadable HTTP cache entry {path}: {e}")
+            return None
+
+    def set(self, url: str, headers: dict[str, str], body: bytes) -> None:
+        if self.read_only or len(body) > self.max_bytes:
+            return
+        path = self.path(url)
+        data = json.dumps(headers).encode() + b"\n" + body
+        try:
+            write_atomically(path, data)
+        except (IOError, TypeError, ValueError) as e:
+            logging.warning(f"Could not write HTTP cache entry {path}: {e}")
+
+    def touch(self, url: str) -> None:
+        # Marks a revalidated entry as recently used.
+        if self.read_only:
+            return
+        try:
+            os.utime(self.path(url))
+        except OSError:
+            pass
+
+    def prune(self) -> None:
+        if self.read_only:
+            return
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort(reverse=True)
+        total_bytes = 0
+        for modified, size, path in entries:
+            total_bytes += size
+            if total_bytes > self.max_bytes or time.time() - modified > self.max_age:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def write_json_atomically(path: str, data: Any) -> None:
+    write_atomically(path, json.dumps(data).encode())
+
+
+def write_atomically(path: str, data: bytes) -> None:
+    # Readers in other processes see either the old file or the new one, never a
+    # partial write.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with open(fd, "wb") as file:
+            file.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
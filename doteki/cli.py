@@ -1,41 +1,136 @@
 import argparse
-import contextlib
+import asyncio
+import collections
+import contextvars
+import hashlib
 import importlib
+import inspect
+import json
 import logging
+import math
 import os
 import re
+import shutil
+import string
 import sys
 import tempfile
+import threading
+import time
 from importlib.metadata import version
-from typing import Any
+from typing import Any, Iterable, Iterator
 
 import tomllib
 
+from doteki.breaker import OPEN, CircuitBreakers
+from doteki.cache import HttpCache, OutputCache, cache_key, default_cache_dir
+from doteki.durations import format_duration, parse_duration, parse_seconds
+from doteki.http import HttpClient, current_client
+from doteki.recording import Recorder, Replayer
+from doteki.state import RunState, state_path
+from doteki.watch import FileWatcher
+from doteki.logs import (
+    buffered_logs,
+    configure_logging,
+    flush_logs,
+    plugin_logging_context,
+    unbuffered_context,
+)
+from doteki.process_executor import run_plugin_in_process, serializable_output
+
 DEFAULT_CREDITS = '<a href="https://doteki.org"><img src="https://img.shields.io/badge/powered_by-d%C5%8Dteki-0?style=flat-square&labelColor=202b2d&color=5E936C" align="right" alt="Powered by dōteki"></a>'
 DEFAULT_MARKER_FORMAT = "<!-- {name} {position} -->"
+DEFAULT_JOBS = 1
+DEFAULT_PRIORITY = 0
+DEFAULT_HTTP_CACHE_SIZE = 50  # MiB.
+DEFAULT_HTTP_CACHE_MAX_AGE = 30 * 24 * 60 * 60
+# Defaults for settings that can be set globally and overridden per section.
+SECTION_DEFAULTS = {
+    "cache_ttl": 0,  # Disabled.
+    "max_staleness": 0,  # Never serve stale output.
+    "stale_while_revalidate": False,
+    "timeout": 0,  # No limit.
+    "breaker_threshold": 0,  # Disabled.
+    "breaker_cooldown": 60 * 60,
+    "refresh": 0,  # Every run.
+}
+# With --schedule, failed sections are retried after this long (or after their
+# refresh interval, if shorter), and the configuration is reread at least this often.
+SCHEDULER_RETRY_DELAY = 5 * 60
+SCHEDULER_POLL_INTERVAL = 60
+DEFAULT_EXECUTOR = "thread"
+EXECUTORS = ["thread", "process"]
+# Section settings used by dōteki itself rather than by the plugin.
+CORE_SETTINGS = {
+    "plugin",
+    "prepend_text",
+    "append_text",
+    "inline",
+    "preset",
+    "executor",
+    "cpu_limit",
+    "memory_limit",
+    "memoize",
+    "cache_ttl",
+    "max_staleness",
+    "stale_while_revalidate",
+    "timeout",
+    "priority",
+    "breaker_threshold",
+    "breaker_cooldown",
+    "refresh",
+}
+# Core settings that only change how the output is placed in the README. Sections
+# that differ only in these can share a single run of the plugin.
+FORMATTING_SETTINGS = {
+    "prepend_text",
+    "append_text",
+    "inline",
+    "preset",
+    "priority",
+    "memoize",
+}
 
 
 def main() -> None:
     args = parse_arguments()
-    logging.basicConfig(
-        level=logging.INFO, format="[dōteki] %(levelname)s: %(message)s"
-    )
+    configure_logging()
     exit_if_file_missing(args.input)
     global_config = load_config(args.config)
-    with tempfile.NamedTemporaryFile(
-        delete=False, mode="w+", encoding="utf-8"
-    ) as temp_file:
-        readme_content = read_file_content(args.input)
-        temp_file.write(readme_content)
-        temp_file_path = temp_file.name
-    try:
-        process_sections(global_config, temp_file_path)
-        insert_credits(global_config, temp_file_path)
-        os.replace(temp_file_path, args.input)
-    except Exception as e:
-        logging.error(f"An error occurred: {e}")
-        os.remove(temp_file_path)
+    apply_arguments(global_config, args)
+    if args.watch:
+        watch(args, global_config)
+        return
+    if args.schedule:
+        schedule(args, global_config)
+        return
+    original_content = read_file_content(args.input)
+    # A check leaves caches and breakers as they are for the real runs.
+    run_context = RunContext(global_config, args.input, read_only=args.check)
+    readme_content = render_document(global_config, original_content, run_context)
+    if readme_content is None:
+        run_context.runner.close()
         sys.exit(1)
+    changed = readme_content != original_content
+    written = True
+    if args.check:
+        logging.info(f"{args.input} {'would change' if changed else 'is up to date'}")
+    else:
+        written = write_document(
+            args.input, original_content, readme_content, run_context
+        )
+    # Background refreshes only update the cache, so they can finish after the write.
+    finish_run(run_context)
+    if not written or (args.check and changed):
+        sys.exit(1)
+
+
+def apply_arguments(global_config: dict[str, Any], args: argparse.Namespace) -> None:
+    # Command line options take precedence over the configuration file.
+    for option in ("jobs", "deadline", "record", "replay", "replay_latency"):
+        if getattr(args, option) is not None:
+            global_config[option] = getattr(args, option)
+    if args.only_stale is not None:
+        global_config["only_stale"] = args.only_stale
 
 
 def parse_arguments() -> argparse.Namespace:
@@ -69,9 +164,65 @@ def parse_arguments() -> argparse.Namespace:
         default="README.md",
         help="Path to the README file. Default: README.md",
     )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--check",
+        action="store_true",
+        help="Don't write the README. Exit with an error if it would change",
+    )
+    mode.add_argument(
+        "--schedule",
+        action="store_true",
+        help="Keep running, and update each section whenever its refresh interval elapses",
+    )
+    mode.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running, and update the README whenever it or the configuration changes",
+    )
+    parser.add_argument(
+        "--only-stale",
+        action="store_true",
+        default=None,
+        help="Only run sections whose settings changed, that failed, or whose refresh interval elapsed",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="Number of sections to run in parallel. Overrides 'jobs' in the configuration file. Default: 1",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=duration_argument,
+        help="Maximum wall time for the run, like '90s' or '5m'. Sections still running are abandoned. Overrides 'deadline' in the configuration file",
+    )
+    recording = parser.add_mutually_exclusive_group()
+    recording.add_argument(
+        "--record",
+        metavar="DIR",
+        help="Save every HTTP exchange of the run to DIR, with credentials redacted",
+    )
+    recording.add_argument(
+        "--replay",
+        metavar="DIR",
+        help="Serve HTTP requests from a recording in DIR instead of the network",
+    )
+    parser.add_argument(
+        "--replay-latency",
+        metavar="LATENCY",
+        help="With --replay, delay each response by LATENCY (like '0.2s'), or by the recorded time with 'recorded'. Default: 0",
+    )
     return parser.parse_args()
 
 
+def duration_argument(value: str) -> float:
+    try:
+        return parse_seconds(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
 def exit_if_file_missing(file_path: str) -> None:
     if not os.path.exists(file_path):
         logging.error(f"File not found: {file_path}")
@@ -80,12 +231,21 @@ def exit_if_file_missing(file_path: str) -> None:
 
 def load_config(config_path: str) -> dict[str, Any]:
     exit_if_file_missing(config_path)
+    global_config = read_config(config_path)
+    if global_config is None:
+        sys.exit(1)
+    return global_config
+
+
+def read_config(config_path: str) -> dict[str, Any] | None:
     try:
         with open(config_path, "rb") as config_file:
             return tomllib.load(config_file)
     except tomllib.TOMLDecodeError as e:
         logging.error(f"Error parsing TOML file: {e}")
-        sys.exit(1)
+    except IOError as e:
+        logging.error(f"An error occurred while reading {config_path}: {e}")
+    return None
 
 
 def read_file_content(filepath: str) -> str:
@@ -97,87 +257,883 @@ def read_file_content(filepath: str) -> str:
         return ""
 
 
-def process_sections(global_config: dict[str, Any], readme_path: str) -> None:
-    for section, section_settings in global_config["sections"].items():
-        section_context = SectionContext(section, section_settings, readme_path)
-        update_readme_content(section_context, global_config)
-
-
 class SectionContext:
     def __init__(
         self,
         name: str,
         settings: dict[str, Any],
-        readme_path: str,
+        indices: list[tuple[int, int]],
     ):
         self.name: str = name
         self.settings: dict[str, Any] = settings
-        self.readme_path: str = readme_path
+        self.indices: list[tuple[int, int]] = indices
 
 
-def update_readme_content(
-    section_context: SectionContext, global_config: dict[str, Any]
-) -> None:
+class RunContext:
+    # State shared by every section during a single run.
+    def __init__(
+        self,
+        global_config: dict[str, Any] | None = None,
+        document_path: str | None = None,
+        http: HttpClient | None = None,
+        track_state: bool = False,
+        read_only: bool = False,
+    ):
+        self.global_config: dict[str, Any] = global_config or {}
+        self.started: float = time.monotonic()
+        self.jobs: int = get_jobs(self.global_config)
+        self.deadline: float = get_deadline(self.global_config)
+        cache_dir = get_cache_dir(self.global_config)
+        # Read-only runs don't write to the caches or the breakers, and don't
+        # refresh stale outputs in the background.
+        self.read_only: bool = read_only
+        self.cache: OutputCache = OutputCache(cache_dir, read_only)
+        self.breakers: CircuitBreakers = CircuitBreakers(cache_dir, read_only)
+        # A client passed in outlives the run, keeping its connections open.
+        self.owns_http: bool = http is None
+        self.http: HttpClient = http or get_http_client(
+            self.global_config, cache_dir, read_only
+        )
+        # Run state is only kept when something reads it back.
+        self.state: RunState | None = None
+        if document_path is not None and (
+            track_state or uses_run_state(self.global_config)
+        ):
+            self.state = RunState(
+                self.global_config.get("state_file")
+                or state_path(cache_dir, document_path)
+            )
+        # The event loop outlives the render, so background refreshes can finish
+        # after the document is written.
+        self.runner: asyncio.Runner = asyncio.Runner()
+        self.memo: dict[str, asyncio.Future[Any]] = {}
+        self.background_tasks: set[asyncio.Task[Any]] = set()
+        self.stats: collections.Counter[str] = collections.Counter()
+        # Only run sections whose settings or content changed since the last run.
+        self.only_changed: bool = False
+        # Only run sections that are due, and note when the next one will be.
+        self.scheduled: bool = False
+        self.next_run: float = math.inf
+
+    def time_left(self) -> float | None:
+        if not self.deadline:
+            return None
+        return max(0.0, self.deadline - (time.monotonic() - self.started))
+
+
+class Document:
+    # A piece table: the original content plus replacement chunks keyed by start index.
+    # The full text is only assembled once, in render().
+    def __init__(self, content: str):
+        self.content: str = content
+        self.replacements: dict[int, tuple[int, str]] = {}
+
+    def replace(self, start_index: int, end_index: int, new_content: str) -> None:
+        self.replacements[start_index] = (end_index, new_content)
+
+    def chunks(self) -> Iterator[str]:
+        position = 0
+        for start_index in sorted(self.replacements):
+            end_index, new_content = self.replacements[start_index]
+            yield self.content[position:start_index]
+            yield new_content
+            position = end_index
+        yield self.content[position:]
+
+    def render(self) -> str:
+        return "".join(self.chunks())
+
+    def region(self, start_index: int, end_index: int) -> str:
+        if start_index in self.replacements:
+            return self.replacements[start_index][1]
+        return self.content[start_index:end_index]
+
+
+def render_document(
+    global_config: dict[str, Any], original_content: str, run_context: RunContext
+) -> str | None:
+    try:
+        readme_content = process_sections(global_config, original_content, run_context)
+        return insert_credits(global_config, readme_content)
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        return None
+
+
+def write_document(
+    path: str, original_content: str, readme_content: str, run_context: RunContext
+) -> bool:
+    if readme_content == original_content:
+        # Leave the file (and its modification time) alone.
+        logging.info(f"No changes to {path}")
+    elif not write_file_content(path, readme_content):
+        return False
+    # The state describes the README on disk, so it's only kept once that's up to date.
+    if run_context.state is not None:
+        run_context.state.save()
+    return True
+
+
+def watch(args: argparse.Namespace, global_config: dict[str, Any]) -> None:
+    # Renders the README, then again whenever it or the configuration changes.
+    # Plugins stay imported and HTTP connections stay open between renders.
+    # After the first render, only sections whose settings or markers changed
+    # (or that failed) run again.
+    watcher = FileWatcher([args.config, args.input])
+    http = get_http_client(global_config, get_cache_dir(global_config))
+    written_content = None
+    only_changed = False
+    logging.info(
+        f"Watching {args.config} and {args.input} for changes. Press Ctrl+C to stop"
+    )
+    try:
+        while True:
+            original_content = read_file_content(args.input)
+            run_context = RunContext(global_config, args.input, http, track_state=True)
+            run_context.only_changed = only_changed
+            readme_content = render_document(
+                global_config, original_content, run_context
+            )
+            if readme_content is None:
+                run_context.runner.close()
+            else:
+                if write_document(
+                    args.input, original_content, readme_content, run_context
+                ):
+                    written_content = readme_content
+                    only_changed = True
+                finish_run(run_context)
+            while True:
+                changed = watcher.wait()
+                if args.config in changed:
+                    new_config, http = reload_config(args, global_config, http)
+                    if new_config is global_config:
+                        continue
+                    global_config = new_config
+                    logging.info(f"{args.config} changed")
+                    break
+                # Our own writes also show up as changes.
+                if read_file_content(args.input) != written_content:
+                    logging.info(f"{args.input} changed")
+                    break
+    except KeyboardInterrupt:
+        logging.info("Stopped watching")
+    finally:
+        watcher.close()
+        http.close()
+
+
+def schedule(args: argparse.Namespace, global_config: dict[str, Any]) -> None:
+    # Keeps running and renders the README whenever sections are due, according
+    # to their `refresh` interval. Sections that are due together are rendered
+    # together, so the README is written at most once per wake-up. Sections
+    # without a `refresh` interval run when they change.
+    http = get_http_client(global_config, get_cache_dir(global_config))
+    logging.info(f"Scheduling the sections of {args.input}. Press Ctrl+C to stop")
+    try:
+        while True:
+            original_content = read_file_content(args.input)
+            run_context = RunContext(global_config, args.input, http, track_state=True)
+            run_context.scheduled = True
+            readme_content = render_document(
+                global_config, original_content, run_context
+            )
+            written = False
+            if readme_content is None:
+                run_context.runner.close()
+            else:
+                if run_context.stats["due_sections"]:
+                    written = write_document(
+                        args.input, original_content, readme_content, run_context
+                    )
+                finish_run(run_context)
+            # After a render, check right away when the sections are next due.
+            if not written:
+                sleep_until(run_context.next_run)
+                global_config, http = reload_config(args, global_config, http)
+    except KeyboardInterrupt:
+        logging.info("Stopped the scheduler")
+    finally:
+        http.close()
+
+
+def sleep_until(timestamp: float) -> None:
+    # Wakes up at least every SCHEDULER_POLL_INTERVAL to notice configuration changes.
+    time.sleep(min(max(timestamp - time.time(), 0), SCHEDULER_POLL_INTERVAL))
+
+
+def reload_config(
+    args: argparse.Namespace, global_config: dict[str, Any], http: HttpClient
+) -> tuple[dict[str, Any], HttpClient]:
+    # Returns the current configuration (unchanged if the file is invalid) and an
+    # HTTP client that matches it.
+    new_config = read_config(args.config)
+    if new_config is None:
+        return global_config, http
+    apply_arguments(new_config, args)
+    if without_sections(new_config) != without_sections(global_config):
+        # Global settings like the HTTP cache may have changed.
+        http.close()
+        http = get_http_client(new_config, get_cache_dir(new_config))
+    return new_config, http
+
+
+def without_sections(global_config: dict[str, Any]) -> dict[str, Any]:
+    return {key: value for key, value in global_config.items() if key != "sections"}
+
+
+def process_sections(
+    global_config: dict[str, Any],
+    readme_content: str,
+    run_context: RunContext | None = None,
+) -> str:
+    sections = global_config["sections"]
+    marker_format = global_config.get("marker_format", DEFAULT_MARKER_FORMAT)
+    marker_index = index_section_markers(readme_content, sections, marker_format)
+    document = Document(readme_content)
+    section_contexts = sorted(
+        (
+            SectionContext(section, section_settings, marker_index[section])
+            for section, section_settings in sections.items()
+        ),
+        # Higher priorities run first; ties keep the configuration order.
+        key=lambda section_context: -get_priority(section_context),
+    )
+    owns_run = run_context is None
+    if run_context is None:
+        run_context = RunContext(global_config)
+    if run_context.scheduled:
+        section_contexts = select_due_sections(section_contexts, document, run_context)
+    elif global_config.get("only_stale") or run_context.only_changed:
+        section_contexts = select_stale_sections(
+            section_contexts, document, run_context
+        )
+    run_context.runner.run(run_sections(section_contexts, document, run_context))
+    log_run_summary(run_context)
+    if owns_run:
+        finish_run(run_context)
+    return document.render()
+
+
+def select_stale_sections(
+    section_contexts: list[SectionContext], document: Document, run_context: RunContext
+) -> list[SectionContext]:
+    if run_context.state is None:
+        logging.warning("No run state to compare with. Running every section")
+        return section_contexts
+    stale_sections = []
+    for section_context in section_contexts:
+        regions = [document.region(*indices) for indices in section_context.indices]
+        refresh = (
+            math.inf
+            if run_context.only_changed
+            else get_duration_setting("refresh", section_context.settings, run_context)
+        )
+        reason = run_context.state.stale_reason(
+            section_context.name, section_context.settings, regions, refresh
+        )
+        if reason is None:
+            logging.info(f"Skipping section '{section_context.name}': it's up to date")
+        else:
+            logging.info(f"Running section '{section_context.name}': {reason}")
+            stale_sections.append(section_context)
+    return stale_sections
+
+
+def select_due_sections(
+    section_contexts: list[SectionContext], document: Document, run_context: RunContext
+) -> list[SectionContext]:
+    assert run_context.state is not None
+    now = time.time()
+    due_sections = []
+    for section_context in section_contexts:
+        regions = [document.region(*indices) for indices in section_context.indices]
+        refresh = (
+            get_duration_setting("refresh", section_context.settings, run_context)
+            or math.inf
+        )
+        due_at = run_context.state.due_at(
+            section_context.name,
+            section_context.settings,
+            regions,
+            refresh,
+            min(refresh, SCHEDULER_RETRY_DELAY),
+        )
+        if due_at <= now:
+            due_sections.append(section_context)
+        else:
+            run_context.next_run = min(run_context.next_run, due_at)
+    if due_sections:
+        names = ", ".join(section_context.name for section_context in due_sections)
+        logging.info(f"Running due sections: {names}")
+    run_context.stats["due_sections"] = len(due_sections)
+    return due_sections
+
+
+def finish_run(run_context: RunContext) -> None:
+    if run_context.background_tasks:
+        done, pending = run_context.runner.run(
+            asyncio.wait(run_context.background_tasks, timeout=run_context.time_left())
+        )
+        for task in pending:
+            task.cancel()
+        logging.info(f"Refreshed {len(done)} stale outputs in the background")
+        if pending:
+            logging.warning(
+                f"Abandoned {len(pending)} background refreshes at the run deadline"
+            )
+    run_context.breakers.save()
+    if run_context.owns_http:
+        run_context.http.close()
+    else:
+        run_context.http.reset()
+    run_context.runner.close()
+
+
+def get_jobs(global_config: dict[str, Any]) -> int:
+    jobs = global_config.get("jobs", DEFAULT_JOBS)
+    if not isinstance(jobs, int) or isinstance(jobs, bool) or jobs < 1:
+        logging.error(
+            f"Invalid value for jobs: '{jobs}'. Expected a positive integer. Using {DEFAULT_JOBS}"
+        )
+        return DEFAULT_JOBS
+    return jobs
+
+
+def uses_run_state(global_config: dict[str, Any]) -> bool:
+    sections = global_config.get("sections", {})
+    return bool(
+        global_config.get("only_stale")
+        or "refresh" in global_config
+        or any("refresh" in settings for settings in sections.values())
+    )
+
+
+def get_cache_dir(global_config: dict[str, Any]) -> str:
+    cache_dir: str = global_config.get("cache_dir", default_cache_dir())
+    return cache_dir
+
+
+def get_deadline(global_config: dict[str, Any]) -> float:
+    try:
+        return parse_duration(global_config.get("deadline", 0))
+    except ValueError as e:
+        logging.error(f"Invalid value for deadline: {e}. Ignoring it")
+        return 0
+
+
+def get_http_client(
+    global_config: dict[str, Any], cache_dir: str, read_only: bool = False
+) -> HttpClient:
+    record, replay = global_config.get("record"), global_config.get("replay")
+    if record and replay:
+        logging.error("Can't record and replay at the same time. Only replaying")
+        record = None
+    # Recordings must hold full responses, and replays must not depend on what's
+    # cached locally, so the HTTP cache is off for both.
+    cache = (
+        None
+        if record or replay
+        else get_http_cache(global_config, cache_dir, read_only)
+    )
+    return HttpClient(
+        cache=cache,
+        reuse_responses=True,
+        recorder=Recorder(record) if record else None,
+        replayer=(
+            Replayer(replay, get_replay_latency(global_config)) if replay else None
+        ),
+    )
+
+
+def get_replay_latency(global_config: dict[str, Any]) -> float | None:
+    latency = global_config.get("replay_latency", 0)
+    if latency == "recorded":
+        return None
+    try:
+        return parse_seconds(latency)
+    except ValueError as e:
+        logging.error(f"Invalid value for replay_latency: {e}. Using 0")
+        return 0
+
+
+def get_http_cache(
+    global_config: dict[str, Any], cache_dir: str, read_only: bool = False
+) -> HttpCache | None:
+    size = global_config.get("http_cache_size", DEFAULT_HTTP_CACHE_SIZE)
+    if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+        logging.error(
+            f"Invalid value for http_cache_size: '{size}'. Expected a number of MiB. Using {DEFAULT_HTTP_CACHE_SIZE}"
+        )
+        size = DEFAULT_HTTP_CACHE_SIZE
+    if not size:
+        return None
+    try:
+        max_age = parse_duration(
+            global_config.get("http_cache_max_age", DEFAULT_HTTP_CACHE_MAX_AGE)
+        )
+    except ValueError as e:
+        logging.error(f"Invalid value for http_cache_max_age: {e}. Using 30d")
+        max_age = DEFAULT_HTTP_CACHE_MAX_AGE
+    return HttpCache(cache_dir, size * 1024 * 1024, max_age, read_only)
+
+
+def get_priority(section_context: SectionContext) -> int:
+    priority = section_context.settings.get("priority", DEFAULT_PRIORITY)
+    if not isinstance(priority, int) or isinstance(priority, bool):
+        logging.error(
+            f"Invalid value for priority in section '{section_context.name}': '{priority}'. Expected an integer. Using {DEFAULT_PRIORITY}"
+        )
+        return DEFAULT_PRIORITY
+    return priority
+
+
+async def update_readme_content(
+    section_context: SectionContext,
+    document: Document,
+    run_context: RunContext | None = None,
+) -> bool:
+    # Returns whether every region of the section was updated.
     section = section_context.name
     plugin_name = section_context.settings.get("plugin")
     if not plugin_name:
         logging.error(f"No plugin specified for section '{section}'")
-        return
+        return False
     inline = section_context.settings.get("inline", False)
-    readme_content = read_file_content(section_context.readme_path)
-    marker_format = global_config.get("marker_format", DEFAULT_MARKER_FORMAT)
-    section_indices = find_section_indices(readme_content, section, marker_format)
 
-    for start_index, end_index in reversed(section_indices):
+    succeeded = True
+
+    for start_index, end_index in reversed(section_context.indices):
         # Run the plugin in a logging context that includes the plugin name in the logs.
-        with plugin_logging_context(plugin_name):
-            new_content = get_plugin_output(plugin_name, section_context.settings)
+        with plugin_logging_context(plugin_name, section):
+            new_content = await get_plugin_output(
+                plugin_name, section_context.settings, run_context
+            )
         if new_content is None:
             logging.error(
                 f"No content returned by plugin '{plugin_name}' for section '{section}'"
             )
+            succeeded = False
             continue
-        readme_content = replace_section_content(
-            readme_content, new_content, start_index, end_index, inline
+        replace_section_content(document, new_content, start_index, end_index, inline)
+    return succeeded
+
+
+async def run_sections(
+    section_contexts: list[SectionContext], document: Document, run_context: RunContext
+) -> None:
+    # Async plugins share this event loop; sync plugins run in worker threads.
+    # Each section writes to its own regions; the document sorts them when rendering.
+    semaphore = asyncio.Semaphore(run_context.jobs)
+    # Plugins share the run's HTTP client; tasks and threads inherit the context.
+    current_client.set(run_context.http)
+    # Logs are buffered per section and flushed in section order, as soon as a
+    # section and every section before it are done.
+    section_logs: list[list[logging.LogRecord]] = [[] for _ in section_contexts]
+    finished = [False] * len(section_contexts)
+    flushed = 0
+
+    def flush_finished_logs() -> None:
+        nonlocal flushed
+        while flushed < len(section_logs) and finished[flushed]:
+            flush_logs(section_logs[flushed])
+            flushed += 1
+
+    async def run_section(
+        index: int,
+        section_context: SectionContext,
+        records: list[logging.LogRecord],
+    ) -> None:
+        try:
+            await update_section(section_context, records)
+        finally:
+            finished[index] = True
+            flush_finished_logs()
+
+    async def update_section(
+        section_context: SectionContext, records: list[logging.LogRecord]
+    ) -> None:
+        async with semaphore:
+            started = time.monotonic()
+            if run_context.jobs == 1:
+                succeeded = await update_readme_content(
+                    section_context, document, run_context
+                )
+            else:
+                with buffered_logs(records):
+                    succeeded = await update_readme_content(
+                        section_context, document, run_context
+                    )
+            if run_context.state is not None and section_context.indices:
+                run_context.state.record(
+                    section_context.name,
+                    section_context.settings,
+                    [document.region(*indices) for indices in section_context.indices],
+                    succeeded,
+                    time.monotonic() - started,
+                )
+
+    tasks = [
+        asyncio.create_task(run_section(index, section_context, records))
+        for index, (section_context, records) in enumerate(
+            zip(section_contexts, section_logs)
+        )
+    ]
+    _, pending = await asyncio.wait(tasks, timeout=run_context.time_left())
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.wait(pending)
+    if pending:
+        # Sections that finished are kept; the others keep their current content.
+        abandoned = [
+            section_context.name
+            for section_context, task in zip(section_contexts, tasks)
+            if task in pending
+        ]
+        logging.error(
+            f"Run deadline of {run_context.deadline:g}s reached. Abandoned sections: {', '.join(abandoned)}"
         )
 
-    write_file_content(section_context.readme_path, readme_content)
 
+def log_run_summary(run_context: RunContext) -> None:
+    stats = run_context.stats
+    if stats["cache_hits"] or stats["cache_misses"]:
+        logging.info(
+            f"Cache: {stats['cache_hits']} hits, {stats['cache_misses']} misses"
+        )
+    if stats["stale_served"]:
+        logging.info(f"Served {stats['stale_served']} stale outputs")
+    if stats["timeouts"]:
+        logging.warning(f"{stats['timeouts']} plugins timed out")
+    http_stats = run_context.http.stats
+    if http_stats["requests"]:
+        logging.info(
+            f"HTTP: {http_stats['requests']} requests to {len(run_context.http.hosts)} hosts ({http_stats['retries']} retries, {http_stats['not_modified']} not modified, {http_stats['shared']} shared), {http_stats['bytes'] / 1024:.1f} KiB in {http_stats['milliseconds'] / 1000:.1f}s"
+        )
+    if run_context.breakers.entries is None:
+        return
+    for breaker in run_context.breakers.tripped():
+        message = f"Circuit breaker for '{breaker.plugin}' ({breaker.endpoint}) is {breaker.state} after {breaker.failures} consecutive failures"
+        if breaker.state == OPEN:
+            message += f". Retrying in {format_duration(breaker.retry_in)}"
+        logging.warning(message)
 
-def find_section_indices(content: str, section: str, marker_format: str) -> list[tuple]:
-    start_marker = re.escape(marker_format.format(name=section, position="start"))
-    end_marker = re.escape(marker_format.format(name=section, position="end"))
-    start_indices = [m.end() for m in re.finditer(start_marker, content)]
-    end_indices = [m.start() for m in re.finditer(end_marker, content)]
-    if not start_indices and not end_indices:
-        logging.error(f"No markers found for section '{section}'")
-        return []
-    elif len(start_indices) != len(end_indices):
-        logging.error(f"Mismatched markers for section '{section}'")
-        return []
-    return list(zip(start_indices, end_indices))
 
+def find_section_indices(
+    content: str, section: str, marker_format: str
+) -> list[tuple[int, int]]:
+    return index_section_markers(content, [section], marker_format)[section]
 
-@contextlib.contextmanager
-def plugin_logging_context(plugin_name: str):
-    original_formatter = logging.getLogger().handlers[0].formatter
-    new_format = f"[{plugin_name}] %(levelname)s: %(message)s"
-    logging.getLogger().handlers[0].setFormatter(logging.Formatter(new_format))
 
-    try:
-        yield
-    finally:
-        # Revert to the original logging format.
-        logging.getLogger().handlers[0].setFormatter(original_formatter)
+def index_section_markers(
+    content: str, sections: Iterable[str], marker_format: str
+) -> dict[str, list[tuple[int, int]]]:
+    section_names = list(sections)
+    marker_index: dict[str, list[tuple[int, int]]] = {
+        section: [] for section in section_names
+    }
+    if not section_names:
+        return marker_index
+
+    # Each marker is stored as (span start, span end) in the document.
+    start_markers: dict[str, list[tuple[int, int]]] = {
+        section: [] for section in section_names
+    }
+    end_markers: dict[str, list[tuple[int, int]]] = {
+        section: [] for section in section_names
+    }
+    marker_pattern = compile_marker_pattern(section_names, marker_format)
+    for match in marker_pattern.finditer(content):
+        markers = start_markers if match.group("position") == "start" else end_markers
+        markers[match.group("name")].append(match.span())
+
+    marker_spans = {}
+    for section in section_names:
+        starts, ends = start_markers[section], end_markers[section]
+        if not starts and not ends:
+            logging.error(f"No markers found for section '{section}'")
+            continue
+        if len(starts) != len(ends) or not markers_alternate(starts, ends):
+            logging.error(f"Mismatched markers for section '{section}'")
+            continue
+        marker_spans[section] = [(start[0], end[1]) for start, end in zip(starts, ends)]
+        marker_index[section] = [(start[1], end[0]) for start, end in zip(starts, ends)]
+
+    for section in find_crossing_sections(marker_spans):
+        marker_index[section] = []
+    return marker_index
+
+
+def compile_marker_pattern(
+    section_names: list[str], marker_format: str
+) -> re.Pattern[str]:
+    # Longest names first, so a name that prefixes another can't shadow it.
+    names = sorted(section_names, key=len, reverse=True)
+    name_pattern = "|".join(re.escape(name) for name in names)
+    pattern = ""
+    seen_fields = set()
+    for literal, field, _, _ in string.Formatter().parse(marker_format):
+        pattern += re.escape(literal)
+        if field is None:
+            continue
+        if field not in ("name", "position"):
+            raise KeyError(field)
+        if field in seen_fields:
+            pattern += f"(?P={field})"
+        elif field == "name":
+            pattern += f"(?P<name>{name_pattern})"
+        else:
+            pattern += "(?P<position>start|end)"
+        seen_fields.add(field)
+    if seen_fields != {"name", "position"}:
+        raise ValueError(
+            f"marker_format '{marker_format}' must contain the {{name}} and {{position}} placeholders"
+        )
+    return re.compile(pattern)
+
+
+def markers_alternate(
+    starts: list[tuple[int, int]], ends: list[tuple[int, int]]
+) -> bool:
+    previous_end = 0
+    for start, end in zip(starts, ends):
+        if start[0] < previous_end or end[0] < start[1]:
+            return False
+        previous_end = end[1]
+    return True
+
+
+def find_crossing_sections(marker_spans: dict[str, list[tuple[int, int]]]) -> set[str]:
+    regions = sorted(
+        (start_index, end_index, section)
+        for section, spans in marker_spans.items()
+        for start_index, end_index in spans
+    )
+    crossing_sections = set()
+    outer_region = None
+    for start_index, end_index, section in regions:
+        if outer_region is None or start_index >= outer_region[1]:
+            outer_region = (start_index, end_index, section)
+            continue
+        outer_section = outer_region[2]
+        if end_index <= outer_region[1]:
+            logging.error(
+                f"Markers for section '{section}' are nested inside section '{outer_section}'"
+            )
+        else:
+            logging.error(
+                f"Markers for sections '{outer_section}' and '{section}' overlap"
+            )
+        crossing_sections.add(section)
+    return crossing_sections
+
+
+async def get_plugin_output(
+    plugin_name: str,
+    settings: dict[str, Any],
+    run_context: RunContext | None = None,
+) -> str | None:
+    if run_context is None:
+        plugin_output = await run_plugin(plugin_name, settings)
+    else:
+        plugin_output = await run_plugin_in_context(plugin_name, settings, run_context)
+    if plugin_output is None:
+        return None
+    return format_plugin_output(plugin_output, settings)
 
 
-def get_plugin_output(plugin_name: str, settings: dict[str, Any]) -> str | None:
+async def run_plugin_in_context(
+    plugin_name: str, settings: dict[str, Any], run_context: RunContext
+) -> Any:
+    if not settings.get("memoize", True):
+        return await run_cached_plugin(plugin_name, settings, run_context)
+    # Settings like timeout or executor change how the plugin runs, so only
+    # sections that agree on them share a run.
+    key = invocation_key(plugin_name, settings, FORMATTING_SETTINGS)
+    if key not in run_context.memo:
+        run_context.memo[key] = asyncio.ensure_future(
+            run_cached_plugin(plugin_name, settings, run_context)
+        )
+    # Shielded, so a section that stops waiting doesn't cancel the run for the others.
+    return await asyncio.shield(run_context.memo[key])
+
+
+async def run_cached_plugin(
+    plugin_name: str, settings: dict[str, Any], run_context: RunContext
+) -> Any:
+    cache_ttl = get_duration_setting("cache_ttl", settings, run_context)
+    max_staleness = get_duration_setting("max_staleness", settings, run_context)
+    if not cache_ttl and not max_staleness:
+        return await run_guarded_plugin(plugin_name, settings, run_context)
+
+    key = cache_key(plugin_name, invocation_key(plugin_name, settings))
+    entry = run_context.cache.get(key)
+    if entry is not None and entry.age() <= cache_ttl:
+        run_context.stats["cache_hits"] += 1
+        return entry.output
+    if cache_ttl:
+        run_context.stats["cache_misses"] += 1
+
+    stale_entry = entry if entry is not None and entry.age() <= max_staleness else None
+    if stale_entry is not None and get_section_setting(
+        "stale_while_revalidate", settings, run_context
+    ):
+        run_context.stats["stale_served"] += 1
+        if run_context.read_only:
+            logging.info(
+                f"Serving output from {format_duration(stale_entry.age())} ago"
+            )
+            return stale_entry.output
+        logging.info(
+            f"Serving output from {format_duration(stale_entry.age())} ago while it refreshes"
+        )
+        refresh = refresh_cached_output(plugin_name, settings, run_context, key)
+        # Refresh outside the section's log buffer, which is flushed before the refresh ends.
+        run_context.background_tasks.add(
+            asyncio.get_running_loop().create_task(
+                refresh, context=unbuffered_context()
+            )
+        )
+        return stale_entry.output
+
+    plugin_output = await refresh_cached_output(plugin_name, settings, run_context, key)
+    if plugin_output is None and stale_entry is not None:
+        logging.warning(
+            f"Serving the last successful output, from {format_duration(stale_entry.age())} ago"
+        )
+        run_context.stats["stale_served"] += 1
+        return stale_entry.output
+    return plugin_output
+
+
+async def refresh_cached_output(
+    plugin_name: str, settings: dict[str, Any], run_context: RunContext, key: str
+) -> Any:
+    plugin_output = await run_guarded_plugin(plugin_name, settings, run_context)
+    if plugin_output is not None:
+        run_context.cache.set(key, plugin_name, serializable_output(plugin_output))
+    return plugin_output
+
+
+async def run_guarded_plugin(
+    plugin_name: str, settings: dict[str, Any], run_context: RunContext
+) -> Any:
+    threshold = get_breaker_threshold(settings, run_context)
+    if not threshold:
+        return await run_plugin_with_timeout(plugin_name, settings, run_context)
+
+    endpoint = get_plugin_endpoint(plugin_name, settings)
+    key = f"{plugin_name}:{endpoint}"
+    breakers = run_context.breakers
+    breaker = breakers.state(key)
+    if breaker is not None and breaker.state == OPEN:
+        logging.warning(
+            f"Skipping plugin '{plugin_name}' for {endpoint} after {breaker.failures} consecutive failures. Retrying in {format_duration(breaker.retry_in)}"
+        )
+        run_context.stats["breaker_skips"] += 1
+        return None
+
+    plugin_output = await run_plugin_with_timeout(plugin_name, settings, run_context)
+    if plugin_output is None:
+        cooldown = get_duration_setting("breaker_cooldown", settings, run_context)
+        breakers.record_failure(key, plugin_name, endpoint, threshold, cooldown)
+    else:
+        breakers.record_success(key)
+    return plugin_output
+
+
+def get_breaker_threshold(settings: dict[str, Any], run_context: RunContext) -> int:
+    threshold = get_section_setting("breaker_threshold", settings, run_context)
+    if not isinstance(threshold, int) or isinstance(threshold, bool) or threshold < 0:
+        logging.error(
+            f"Invalid value for breaker_threshold: '{threshold}'. Expected a positive integer. Ignoring it"
+        )
+        return 0
+    return threshold
+
+
+def get_plugin_endpoint(plugin_name: str, settings: dict[str, Any]) -> str:
+    # Plugins can name the upstream they call, so sections sharing it share a breaker.
+    # Otherwise, each distinct invocation gets its own. Plugins running in a
+    # worker process are never imported here, so they always get their own.
+    if settings.get("executor") == "process":
+        return invocation_key(plugin_name, settings)
     try:
         plugin_module = importlib.import_module(f"doteki.plugins.{plugin_name}")
-        plugin_output = plugin_module.run(settings)
-        if plugin_output is not None:
-            return format_plugin_output(plugin_output, settings)
+    except ImportError:
+        plugin_module = None
+    endpoint_function = getattr(plugin_module, "endpoint", None)
+    endpoint = endpoint_function(settings) if endpoint_function else None
+    if not isinstance(endpoint, str) or not endpoint:
+        return invocation_key(plugin_name, settings)
+    return endpoint
+
 
+async def run_plugin_with_timeout(
+    plugin_name: str, settings: dict[str, Any], run_context: RunContext
+) -> Any:
+    timeout = get_duration_setting("timeout", settings, run_context)
+    try:
+        return await asyncio.wait_for(
+            run_plugin(plugin_name, settings), timeout=timeout or None
+        )
+    except TimeoutError:
+        logging.error(f"Plugin '{plugin_name}' timed out after {timeout:g}s")
+        run_context.stats["timeouts"] += 1
+        return None
+
+
+def get_section_setting(
+    setting: str, settings: dict[str, Any], run_context: RunContext
+) -> Any:
+    # Section settings take precedence over the global ones.
+    return settings.get(
+        setting, run_context.global_config.get(setting, SECTION_DEFAULTS[setting])
+    )
+
+
+def get_duration_setting(
+    setting: str, settings: dict[str, Any], run_context: RunContext
+) -> float:
+    try:
+        return parse_duration(get_section_setting(setting, settings, run_context))
+    except ValueError as e:
+        logging.error(f"Invalid value for {setting}: {e}. Ignoring it")
+        return 0
+
+
+def invocation_key(
+    plugin_name: str, settings: dict[str, Any], ignored: set[str] = CORE_SETTINGS
+) -> str:
+    # By default, settings handled by dōteki itself are left out: they don't
+    # change what the plugin returns.
+    plugin_settings = {
+        setting: value for setting, value in settings.items() if setting not in ignored
+    }
+    canonical_settings = json.dumps(
+        [plugin_name, plugin_settings],
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical_settings.encode()).hexdigest()
+
+
+async def run_plugin(plugin_name: str, settings: dict[str, Any]) -> Any:
+    executor = settings.get("executor", DEFAULT_EXECUTOR)
+    if executor not in EXECUTORS:
+        logging.error(
+            f"Invalid executor '{executor}' for plugin '{plugin_name}'. Valid options are: {', '.join(EXECUTORS)}"
+        )
+        return None
+    try:
+        if executor == "process":
+            return await run_plugin_in_process(plugin_name, settings)
+        plugin_module = importlib.import_module(f"doteki.plugins.{plugin_name}")
+        if inspect.iscoroutinefunction(plugin_module.run):
+            return await plugin_module.run(settings)
+        return await run_in_daemon_thread(plugin_module.run, settings)
     except ImportError as e:
         logging.error(
             f"Missing dependency for plugin '{plugin_name}': {e}. Try running 'pip install doteki[{plugin_name}]'"
@@ -189,6 +1145,36 @@ def get_plugin_output(plugin_name: str, settings: dict[str, Any]) -> str | None:
     return None
 
 
+async def run_in_daemon_thread(function: Any, *args: Any) -> Any:
+    # Like asyncio.to_thread, but a plugin abandoned after a timeout can't keep
+    # the process alive: daemon threads aren't joined at exit.
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    context = contextvars.copy_context()
+
+    def resolve(result: Any, error: BaseException | None) -> None:
+        if future.cancelled():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def target() -> None:
+        result, error = None, None
+        try:
+            result = context.run(function, *args)
+        except BaseException as e:
+            error = e
+        try:
+            loop.call_soon_threadsafe(resolve, result, error)
+        except RuntimeError:
+            pass  # The loop was closed while the plugin was running.
+
+    threading.Thread(target=target, daemon=True).start()
+    return await future
+
+
 def format_bullet_list(output_list):
     if not output_list:
         return ""
@@ -237,41 +1223,46 @@ def format_plugin_output(plugin_output: Any, settings: dict[str, Any]) -> str:
 
 
 def replace_section_content(
-    original_content: str,
+    document: Document,
     new_content: str,
     start_index: int,
     end_index: int,
     inline: bool,
-) -> str:
+) -> None:
     if not inline:
         new_content = "\n" + new_content + "\n"
-    updated_content = (
-        original_content[:start_index] + new_content + original_content[end_index:]
-    )
-    return updated_content
+    document.replace(start_index, end_index, new_content)
 
 
-def write_file_content(filepath: str, content: str) -> None:
+def write_file_content(filepath: str, content: str) -> bool:
+    # Write to a sibling temporary file and swap it in, so readers never see a partial file.
+    temp_path = None
     try:
-        with open(filepath, "w", encoding="utf-8") as file:
+        directory = os.path.dirname(os.path.abspath(filepath))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".doteki-")
+        os.close(fd)
+        with open(temp_path, "w", encoding="utf-8") as file:
             file.write(content)
+        if os.path.exists(filepath):
+            shutil.copymode(filepath, temp_path)
+        os.replace(temp_path, filepath)
+        return True
     except IOError as e:
         logging.error(f"An error occurred while writing to {filepath}: {e}")
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
 
 
-def insert_credits(global_config: dict[str, Any], readme_path: str) -> None:
-    credits = global_config.get("credits", DEFAULT_CREDITS)
-    readme_content = read_file_content(readme_path)
+def insert_credits(global_config: dict[str, Any], readme_content: str) -> str:
+    credits: str = global_config.get("credits", DEFAULT_CREDITS)
 
     if credits in readme_content:
-        return
+        return readme_content
     elif credits != DEFAULT_CREDITS and DEFAULT_CREDITS in readme_content:
         # Replace default credits with custom ones.
-        readme_content = readme_content.replace(DEFAULT_CREDITS, credits)
-    elif credits not in readme_content:
-        readme_content += "\n" + credits + "\n"
-
-    write_file_content(readme_path, readme_content)
+        return readme_content.replace(DEFAULT_CREDITS, credits)
+    return readme_content + "\n" + credits + "\n"
 
 
 if __name__ == "__main__":
@@ -0,0 +1,51 @@
+import re
+
+DURATION_UNITS = {
+    "s": 1,
+    "m": 60,
+    "h": 60 * 60,
+    "d": 24 * 60 * 60,
+    "w": 7 * 24 * 60 * 60,
+}
+DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)([smhdw])")
+SECONDS_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+
+
+def parse_duration(value: object) -> float:
+    # Accepts seconds as a number, or strings like "90s", "15m", "1h30m" or "7d".
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if value < 0:
+            raise ValueError(f"Invalid duration: '{value}'. Must not be negative")
+        return float(value)
+    if not isinstance(value, str) or not value:
+        raise ValueError(f"Invalid duration: '{value}'")
+    position = 0
+    seconds = 0.0
+    for match in DURATION_PATTERN.finditer(value):
+        if match.start() != position:
+            break
+        seconds += float(match.group(1)) * DURATION_UNITS[match.group(2)]
+        position = match.end()
+    if position != len(value):
+        raise ValueError(
+            f"Invalid duration: '{value}'. Use a number of seconds or a string like '30s', '15m', '1h' or '7d'"
+        )
+    return seconds
+
+
+def parse_seconds(value: object) -> float:
+    # Like parse_duration, but a bare number in a string (as given on the command
+    # line) is also a number of seconds: "90" or "1.5".
+    if isinstance(value, str) and SECONDS_PATTERN.fullmatch(value):
+        return float(value)
+    return parse_duration(value)
+
+
+def format_duration(seconds: float) -> str:
+    # The largest unit that doesn't round up to the next one: 3599.9s is "1h", not "60m".
+    units = list(DURATION_UNITS)
+    for unit, next_unit in zip(units, units[1:]):
+        value = round(seconds / DURATION_UNITS[unit])
+        if value * DURATION_UNITS[unit] < DURATION_UNITS[next_unit]:
+            return f"{value}{unit}"
+    return f"{round(seconds / DURATION_UNITS['w'])}w"
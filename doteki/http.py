@@ -0,0 +1,261 @@
+import collections
+import concurrent.futures
+import contextvars
+import hashlib
+import random
+import threading
+import time
+from typing import Any, Callable
+from urllib.parse import urlsplit
+
+from doteki.cache import HttpCache, HttpCacheEntry
+from doteki.recording import Recorder, Replayer, build_response
+
+DEFAULT_TIMEOUT = (5, 20)  # Seconds to connect, and to wait for each read.
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 0.5  # Seconds; doubles on each retry.
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 4
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Headers kept with cached bodies. Bodies are stored decoded, so Content-Encoding
+# and Content-Length no longer apply.
+CACHED_HEADERS = ["Content-Type", "ETag", "Last-Modified"]
+
+
+class HttpClient:
+    # A pooled session shared by every plugin in a run. Connections are kept alive
+    # and reused, and requests to a host beyond the cap wait for a free connection.
+    # requests is an optional dependency, so it's only imported on first use.
+    #
+    # Identical requests made while one is in flight wait for it and share its
+    # response, as do parses of the same body. With reuse_responses, finished
+    # responses and parses are also kept and shared with later callers; that's
+    # meant for a single run, where the data can't go stale.
+    def __init__(
+        self,
+        retries: int = DEFAULT_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+        max_connections_per_host: int = DEFAULT_MAX_CONNECTIONS_PER_HOST,
+        cache: HttpCache | None = None,
+        reuse_responses: bool = False,
+        recorder: Recorder | None = None,
+        replayer: Replayer | None = None,
+    ):
+        self.retries: int = retries
+        self.backoff: float = backoff
+        self.max_connections_per_host: int = max_connections_per_host
+        self.cache: HttpCache | None = cache
+        self.cache_written: bool = False
+        self.reuse_responses: bool = reuse_responses
+        self.recorder: Recorder | None = recorder
+        self.replayer: Replayer | None = replayer
+        self.responses: dict[str, concurrent.futures.Future[Any]] = {}
+        self.parses: dict[str, concurrent.futures.Future[Any]] = {}
+        self.stats: collections.Counter[str] = collections.Counter()
+        self.hosts: set[str] = set()
+        self.lock: threading.Lock = threading.Lock()
+        self._session: Any = None
+
+    @property
+    def session(self) -> Any:
+        with self.lock:
+            if self._session is None:
+                self._session = create_session(self.max_connections_per_host)
+            return self._session
+
+    def get(self, url: str, **kwargs: Any) -> Any:
+        key = f"{url} {sorted(kwargs.items())!r}"
+        return self.single_flight(
+            self.responses, key, lambda: self.conditional_get(url, **kwargs)
+        )
+
+    def parse(self, response: Any, parser: Callable[[bytes], Any]) -> Any:
+        # Shared results must be treated as read-only by the callers.
+        digest = hashlib.sha256(response.content).hexdigest()
+        key = f"{parser.__module__}.{parser.__qualname__} {digest}"
+        return self.single_flight(self.parses, key, lambda: parser(response.content))
+
+    def single_flight(
+        self,
+        results: dict[str, concurrent.futures.Future[Any]],
+        key: str,
+        function: Callable[[], Any],
+    ) -> Any:
+        with self.lock:
+            future = results.get(key)
+            owner = future is None
+            if future is None:
+                future = results[key] = concurrent.futures.Future()
+        if not owner:
+            self.count("shared")
+            return future.result()
+        try:
+            result = function()
+        except BaseException as e:
+            # Failures are only shared with callers that were already waiting.
+            with self.lock:
+                del results[key]
+            future.set_exception(e)
+            raise
+        if not self.reuse_responses:
+            with self.lock:
+                del results[key]
+        future.set_result(result)
+        return result
+
+    def conditional_get(self, url: str, **kwargs: Any) -> Any:
+        headers = kwargs.get("headers") or {}
+        if (
+            self.cache is None
+            or "If-None-Match" in headers
+            or "If-Modified-Since" in headers
+        ):
+            return self.fetch(url, **kwargs)
+
+        entry = self.cache.get(url)
+        if entry is not None:
+            kwargs["headers"] = {**headers, **entry.validators()}
+        response = self.fetch(url, **kwargs)
+        if entry is not None and response.status_code == 304:
+            self.count("not_modified")
+            self.cache.touch(url)
+            return cached_response(url, entry)
+        if response.status_code == 200 and is_cacheable(response):
+            cached_headers = {
+                name: response.headers[name]
+                for name in CACHED_HEADERS
+                if name in response.headers
+            }
+            self.cache.set(url, cached_headers, response.content)
+            self.cache_written = True
+        return response
+
+    def fetch(self, url: str, **kwargs: Any) -> Any:
+        import requests
+
+        kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+        for attempt in range(self.retries + 1):
+            started = time.monotonic()
+            try:
+                response = self.send(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.record(url, started)
+                if attempt == self.retries:
+                    raise
+            else:
+                self.record(url, started, len(response.content))
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                if attempt == self.retries:
+                    return response
+            self.count("retries")
+            time.sleep(self.backoff_delay(attempt))
+
+    def send(self, url: str, **kwargs: Any) -> Any:
+        import requests
+
+        if self.replayer is not None:
+            return self.replayer.get(prepared_url(url, kwargs.get("params")))
+        if self.recorder is None:
+            return self.session.get(url, **kwargs)
+        # Recorded under the URL as requested, which is what a replay looks up.
+        request_url = prepared_url(url, kwargs.get("params"))
+        started = time.monotonic()
+        try:
+            response = self.session.get(url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            self.recorder.record_error(request_url, e, elapsed(started))
+            raise
+        self.recorder.record_response(request_url, response, elapsed(started))
+        return response
+
+    def backoff_delay(self, attempt: int) -> float:
+        # Full jitter, so sections retrying the same host don't do it in lockstep.
+        return random.uniform(0, self.backoff * 2**attempt)
+
+    def record(self, url: str, started: float, received: int = 0) -> None:
+        with self.lock:
+            self.hosts.add(urlsplit(url).netloc)
+            self.stats["requests"] += 1
+            self.stats["bytes"] += received
+            self.stats["milliseconds"] += round((time.monotonic() - started) * 1000)
+
+    def count(self, stat: str) -> None:
+        with self.lock:
+            self.stats[stat] += 1
+
+    def reset(self) -> None:
+        # Ends a run but keeps the connections open for the next one: responses
+        # shared within the run are forgotten, so the next run fetches fresh data.
+        with self.lock:
+            if self.cache is not None and self.cache_written:
+                self.cache.prune()
+                self.cache_written = False
+            self.responses.clear()
+            self.parses.clear()
+
+    def close(self) -> None:
+        with self.lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+        self.reset()
+        if self.recorder is not None:
+            self.recorder.save()
+
+
+def is_cacheable(response: Any) -> bool:
+    if "ETag" not in response.headers and "Last-Modified" not in response.headers:
+        return False
+    return "no-store" not in response.headers.get("Cache-Control", "")
+
+
+def cached_response(url: str, entry: HttpCacheEntry) -> Any:
+    # Rebuilds the original response from the cache, as if the server sent it again.
+    response = build_response(url, 200, entry.headers, entry.body)
+    response.from_cache = True
+    return response
+
+
+def prepared_url(url: str, params: Any = None) -> str:
+    # The URL with its query parameters, as it's sent.
+    if not params:
+        return url
+    import requests
+
+    return str(requests.Request("GET", url, params=params).prepare().url)
+
+
+def elapsed(started: float) -> float:
+    return time.monotonic() - started
+
+
+def create_session(max_connections_per_host: int) -> Any:
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    # urllib3 keeps one pool per host; blocking makes pool_maxsize a hard cap.
+    adapter = HTTPAdapter(pool_maxsize=max_connections_per_host, pool_block=True)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+current_client: contextvars.ContextVar[HttpClient | None] = contextvars.ContextVar(
+    "doteki_http_client", default=None
+)
+default_client = HttpClient()
+
+
+def client() -> HttpClient:
+    # The run's client when called from a plugin; a process-wide one otherwise
+    # (for example, in the worker of a plugin with executor = "process").
+    return current_client.get() or default_client
+
+
+def get(url: str, **kwargs: Any) -> Any:
+    return client().get(url, **kwargs)
+
+
+def parse(response: Any, parser: Callable[[bytes], Any]) -> Any:
+    return client().parse(response, parser)
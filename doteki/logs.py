@@ -0,0 +1,83 @@
+import contextlib
+import contextvars
+import logging
+from typing import Iterator
+
+DEFAULT_SOURCE = "dōteki"
+LOG_FORMAT = "[%(plugin)s] %(levelname)s: %(message)s"
+
+current_plugin: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "doteki_plugin", default=None
+)
+current_section: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "doteki_section", default=None
+)
+log_buffer: contextvars.ContextVar[list[logging.LogRecord] | None] = (
+    contextvars.ContextVar("doteki_log_buffer", default=None)
+)
+
+
+class PluginContextFilter(logging.Filter):
+    # Tags records with the section and plugin running in the current context.
+    # While a buffer is active, records are held back until flush_logs() is called.
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "plugin"):
+            record.plugin = current_plugin.get() or DEFAULT_SOURCE
+            record.section = current_section.get() or ""
+        buffer = log_buffer.get()
+        if buffer is None:
+            return True
+        # Only buffer once, even if several handlers share the record.
+        if not getattr(record, "buffered", False):
+            record.buffered = True
+            buffer.append(record)
+        return False
+
+
+def configure_logging(level: int = logging.INFO) -> None:
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+    for handler in logging.getLogger().handlers:
+        if not any(isinstance(f, PluginContextFilter) for f in handler.filters):
+            handler.addFilter(PluginContextFilter())
+
+
+@contextlib.contextmanager
+def plugin_logging_context(
+    plugin_name: str, section: str | None = None
+) -> Iterator[None]:
+    plugin_token = current_plugin.set(plugin_name)
+    section_token = current_section.set(section)
+    try:
+        yield
+    finally:
+        current_section.reset(section_token)
+        current_plugin.reset(plugin_token)
+
+
+@contextlib.contextmanager
+def buffered_logs(
+    records: list[logging.LogRecord] | None = None,
+) -> Iterator[list[logging.LogRecord]]:
+    if records is None:
+        records = []
+    token = log_buffer.set(records)
+    try:
+        yield records
+    finally:
+        log_buffer.reset(token)
+
+
+def flush_logs(records: list[logging.LogRecord]) -> None:
+    handlers = logging.getLogger().handlers
+    for record in records:
+        for handler in handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+def unbuffered_context() -> contextvars.Context:
+    # A copy of the current context that logs straight to the handlers, for work
+    # that outlives the buffer of the section that started it.
+    context = contextvars.copy_context()
+    context.run(log_buffer.set, None)
+    return context
@@ -5,6 +5,8 @@ from typing import Any, Optional
 import feedparser
 import requests
 
+from doteki import http
+
 DEFAULT_DATE_FORMAT = "%Y-%m-%d"
 DEFAULT_N = 5
 DEFAULT_SEPARATOR = "·"
@@ -19,7 +21,7 @@ def run(settings: dict[str, Any]) -> str | list[str] | None:
     feed_url = settings["url"]
 
     try:
-        response = requests.get(feed_url)
+        response = http.get(feed_url)
         response.raise_for_status()
         if not response.content:
             logging.error("The response from the URL is empty")
@@ -29,7 +31,8 @@ def run(settings: dict[str, Any]) -> str | list[str] | None:
         return None
 
     try:
-        feed = feedparser.parse(response.content)
+        # Sections reading the same feed share the parsed result.
+        feed = http.parse(response, feedparser.parse)
         if not feed.entries:
             logging.error("Malformed feed: no entries found")
             return None
@@ -56,6 +59,10 @@ def run(settings: dict[str, Any]) -> str | list[str] | None:
     return formatted_entries if n != 1 else formatted_entries[0]
 
 
+def endpoint(settings: dict[str, Any]) -> str | None:
+    return settings.get("url")
+
+
 def validate_settings(settings: dict[str, Any]) -> bool:
     expected_types = {
         "url": str,  # Required
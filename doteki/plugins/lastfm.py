@@ -5,6 +5,8 @@ from typing import Any
 
 import requests
 
+from doteki import http
+
 DEFAULT_DATA_TYPE = "artists"
 DEFAULT_INCLUDE_LINKS = True
 DEFAULT_N = 1
@@ -29,7 +31,7 @@ def run(settings: dict[str, Any]) -> str | list[str] | None:
     url = f"http://ws.audioscrobbler.com/2.0/?method=user.gettop{data_type}&user={username}&period={period}&api_key={api_key}&format=json"
 
     try:
-        response = requests.get(url)
+        response = http.get(url)
         response.raise_for_status()
     except requests.RequestException as e:
         safe_error_message = str(e).replace(api_key, "HIDDEN_API_KEY")
@@ -49,6 +51,11 @@ def run(settings: dict[str, Any]) -> str | list[str] | None:
     return top_items_formatted if n != 1 else top_items_formatted[0]
 
 
+def endpoint(settings: dict[str, Any]) -> str:
+    # One upstream per user; the API key is left out on purpose.
+    return f"ws.audioscrobbler.com/2.0/user/{settings.get('username')}"
+
+
 def validate_settings(settings: dict[str, Any]) -> bool:
     validation_results = []  # Ensures all errors are logged.
     validation_results.append(validate_period(settings.get("period")))
@@ -0,0 +1,198 @@
+import asyncio
+import importlib
+import inspect
+import json
+import logging
+import multiprocessing
+import signal
+from multiprocessing.connection import Connection
+from typing import Any
+
+from doteki import http
+from doteki.http import HttpClient
+from doteki.recording import Recorder, Replayer
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None  # type: ignore[assignment]
+
+DEFAULT_CPU_LIMIT = 10  # Seconds of CPU time.
+DEFAULT_MEMORY_LIMIT = 512  # MiB of address space.
+POLL_INTERVAL = 0.05  # Seconds between checks on the worker.
+
+# Workers are spawned rather than forked: the parent runs threads, and forking
+# a process with threads can deadlock on locks held at fork time.
+process_context = multiprocessing.get_context("spawn")
+
+
+class PluginProcessError(Exception):
+    pass
+
+
+async def run_plugin_in_process(plugin_name: str, settings: dict[str, Any]) -> Any:
+    cpu_limit = settings.get("cpu_limit", DEFAULT_CPU_LIMIT)
+    memory_limit = settings.get("memory_limit", DEFAULT_MEMORY_LIMIT)
+    validate_limits(cpu_limit, memory_limit)
+
+    # Each worker runs a single plugin, so a worker killed for exceeding its
+    # budget can't take down other sections.
+    receiver, sender = process_context.Pipe(duplex=False)
+    process = process_context.Process(
+        target=run_worker,
+        args=(
+            sender,
+            plugin_name,
+            settings,
+            cpu_limit,
+            memory_limit,
+            worker_http_options(),
+        ),
+        daemon=True,
+    )
+    process.start()
+    sender.close()
+    try:
+        result = await receive_result(receiver, process)
+    finally:
+        if process.is_alive():
+            process.kill()
+        process.join()
+        receiver.close()
+
+    for level, message in result["logs"]:
+        logging.log(level, message)
+    recorder = http.client().recorder
+    if recorder is not None and result.get("exchanges"):
+        recorder.add_exchanges(result["exchanges"])
+    if "error" in result:
+        raise_worker_error(result["error"])
+    return result["output"]
+
+
+def validate_limits(cpu_limit: Any, memory_limit: Any) -> None:
+    for name, value in (("cpu_limit", cpu_limit), ("memory_limit", memory_limit)):
+        if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+            raise ValueError(
+                f"Invalid value for {name}: '{value}'. Expected a positive integer"
+            )
+
+
+async def receive_result(
+    receiver: Connection, process: multiprocessing.process.BaseProcess
+) -> dict[str, Any]:
+    # Polling keeps the wait cancellable: on cancellation the caller kills the worker.
+    while not receiver.poll():
+        if not process.is_alive() and not receiver.poll():
+            raise PluginProcessError(describe_exit(process.exitcode))
+        await asyncio.sleep(POLL_INTERVAL)
+    try:
+        result: dict[str, Any] = json.loads(receiver.recv_bytes())
+    except EOFError:
+        process.join()
+        raise PluginProcessError(describe_exit(process.exitcode))
+    return result
+
+
+def describe_exit(exitcode: int | None) -> str:
+    if exitcode == -signal.SIGXCPU:
+        return "Plugin process was killed after exceeding its CPU time limit"
+    if exitcode == -signal.SIGKILL:
+        return "Plugin process was killed"
+    return f"Plugin process exited unexpectedly (exit code {exitcode})"
+
+
+def raise_worker_error(error: dict[str, str]) -> None:
+    # Re-raise in the parent so get_plugin_output reports it as usual.
+    if error["type"] == "ImportError":
+        raise ImportError(error["message"])
+    if error["type"] == "AttributeError":
+        raise AttributeError(error["message"])
+    if error["type"] == "MemoryError":
+        raise PluginProcessError("Plugin process exceeded its memory limit")
+    raise PluginProcessError(error["message"])
+
+
+def worker_http_options() -> dict[str, Any]:
+    # Workers can't share the run's HTTP client, but they record and replay
+    # traffic like it does.
+    client = http.client()
+    if client.replayer is not None:
+        return {
+            "replay": client.replayer.directory,
+            "replay_latency": client.replayer.latency,
+        }
+    if client.recorder is not None:
+        return {"record": True}
+    return {}
+
+
+def worker_http_client(options: dict[str, Any]) -> HttpClient | None:
+    if "replay" in options:
+        return HttpClient(
+            replayer=Replayer(options["replay"], options["replay_latency"])
+        )
+    if options.get("record"):
+        # The exchanges are sent back to the parent, which saves them.
+        return HttpClient(recorder=Recorder(""))
+    return None
+
+
+def run_worker(
+    sender: Connection,
+    plugin_name: str,
+    settings: dict[str, Any],
+    cpu_limit: int,
+    memory_limit: int,
+    http_options: dict[str, Any] | None = None,
+) -> None:
+    set_limits(cpu_limit, memory_limit)
+    handler = RecordingHandler()
+    logging.getLogger().addHandler(handler)
+    logging.getLogger().setLevel(logging.INFO)
+    client = worker_http_client(http_options or {})
+    if client is not None:
+        http.current_client.set(client)
+
+    result: dict[str, Any] = {}
+    try:
+        plugin_module = importlib.import_module(f"doteki.plugins.{plugin_name}")
+        if inspect.iscoroutinefunction(plugin_module.run):
+            output = asyncio.run(plugin_module.run(settings))
+        else:
+            output = plugin_module.run(settings)
+        result["output"] = serializable_output(output)
+    except Exception as e:
+        error_type = "ImportError" if isinstance(e, ImportError) else type(e).__name__
+        result["error"] = {"type": error_type, "message": str(e)}
+    result["logs"] = handler.records
+    if client is not None and client.recorder is not None:
+        result["exchanges"] = client.recorder.exchanges
+    sender.send_bytes(json.dumps(result, separators=(",", ":")).encode())
+    sender.close()
+
+
+def set_limits(cpu_limit: int, memory_limit: int) -> None:
+    if resource is None:  # pragma: no cover
+        return
+    # SIGXCPU at the soft limit, SIGKILL one second later.
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit + 1))
+    memory_bytes = memory_limit * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+
+
+def serializable_output(output: Any) -> str | list[str] | None:
+    if output is None:
+        return None
+    if isinstance(output, list):
+        return list(map(str, output))
+    return str(output)
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.records: list[tuple[int, str]] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records.append((record.levelno, record.getMessage()))
@@ -0,0 +1,178 @@
+import base64
+import collections
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any
+
+from doteki.cache import write_atomically
+
+EXCHANGES_FILE = "exchanges.jsonl"
+REDACTED = "REDACTED"
+SENSITIVE_PARAMETERS = [
+    "access_token",
+    "api_key",
+    "apikey",
+    "key",
+    "password",
+    "secret",
+    "signature",
+    "token",
+]
+SENSITIVE_HEADERS = {
+    "authorization",
+    "cookie",
+    "proxy-authorization",
+    "set-cookie",
+    "x-api-key",
+}
+# Bodies are stored decoded, so these no longer describe them.
+BODY_ENCODING_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+SENSITIVE_PARAMETER_PATTERN = re.compile(
+    rf"([?&](?:{'|'.join(SENSITIVE_PARAMETERS)})=)[^&#]*", re.IGNORECASE
+)
+
+
+class Recorder:
+    # Captures every HTTP exchange of a run, with credentials redacted, and writes
+    # them to a directory that Replayer can serve them from.
+    def __init__(self, directory: str):
+        self.directory: str = directory
+        self.exchanges: list[dict[str, Any]] = []
+        self.lock: threading.Lock = threading.Lock()
+
+    def record_response(self, url: str, response: Any, elapsed: float) -> None:
+        headers = {
+            name: redact(value)
+            for name, value in response.headers.items()
+            if name.lower() not in SENSITIVE_HEADERS | BODY_ENCODING_HEADERS
+        }
+        exchange = {
+            "method": "GET",
+            "url": redact(url),
+            "status": response.status_code,
+            "headers": headers,
+            "elapsed": round(elapsed, 3),
+            **encode_body(redact_body(response.content)),
+        }
+        with self.lock:
+            self.exchanges.append(exchange)
+
+    def record_error(self, url: str, error: Exception, elapsed: float) -> None:
+        exchange = {
+            "method": "GET",
+            "url": redact(url),
+            "error": type(error).__name__,
+            "message": redact(str(error)),
+            "elapsed": round(elapsed, 3),
+        }
+        with self.lock:
+            self.exchanges.append(exchange)
+
+    def add_exchanges(self, exchanges: list[dict[str, Any]]) -> None:
+        # Exchanges recorded elsewhere, like in a plugin's worker process.
+        with self.lock:
+            self.exchanges.extend(exchanges)
+
+    def save(self) -> None:
+        path = os.path.join(self.directory, EXCHANGES_FILE)
+        lines = [json.dumps(exchange) + "\n" for exchange in self.exchanges]
+        try:
+            write_atomically(path, "".join(lines).encode())
+            logging.info(f"Recorded {len(lines)} HTTP exchanges to {path}")
+        except IOError as e:
+            logging.error(f"Could not write the recording to {path}: {e}")
+
+
+class Replayer:
+    # Serves recorded exchanges instead of the network. Repeated requests for a
+    # URL get its recorded responses in order, then the last one again.
+    def __init__(self, directory: str, latency: float | None = None):
+        self.directory: str = directory
+        self.path: str = os.path.join(directory, EXCHANGES_FILE)
+        # None replays the latency that was recorded with each exchange.
+        self.latency: float | None = latency
+        self.exchanges: dict[str, collections.deque[dict[str, Any]]] = (
+            collections.defaultdict(collections.deque)
+        )
+        self.lock: threading.Lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                for line in file:
+                    exchange = json.loads(line)
+                    self.exchanges[exchange["url"]].append(exchange)
+        except (IOError, ValueError, KeyError) as e:
+            logging.error(f"Could not read the recording at {self.path}: {e}")
+
+    def get(self, url: str) -> Any:
+        import requests
+
+        with self.lock:
+            exchanges = self.exchanges.get(redact(url))
+            if not exchanges:
+                raise requests.ConnectionError(
+                    f"No recorded response for GET {redact(url)}"
+                )
+            exchange = exchanges.popleft() if len(exchanges) > 1 else exchanges[0]
+        time.sleep(exchange["elapsed"] if self.latency is None else self.latency)
+        if "error" in exchange:
+            error_type = getattr(requests, exchange["error"], requests.ConnectionError)
+            raise error_type(exchange["message"])
+        return build_response(
+            url, exchange["status"], exchange["headers"], decode_body(exchange)
+        )
+
+
+def redact(text: str) -> str:
+    text = SENSITIVE_PARAMETER_PATTERN.sub(rf"\1{REDACTED}", text)
+    for secret in secret_values():
+        text = text.replace(secret, REDACTED)
+    return text
+
+
+def redact_body(body: bytes) -> bytes:
+    for secret in secret_values():
+        body = body.replace(secret.encode(), REDACTED.encode())
+    return body
+
+
+def secret_values() -> list[str]:
+    # Plugins read their secrets from DOTEKI_<PLUGIN>_* variables.
+    # Very short values would redact unrelated text, so they're left alone.
+    return [
+        value
+        for name, value in os.environ.items()
+        if name.startswith("DOTEKI_") and len(value) >= 4
+    ]
+
+
+def encode_body(body: bytes) -> dict[str, str]:
+    try:
+        return {"body": body.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"body_base64": base64.b64encode(body).decode("ascii")}
+
+
+def decode_body(exchange: dict[str, Any]) -> bytes:
+    if "body_base64" in exchange:
+        return base64.b64decode(exchange["body_base64"])
+    return str(exchange.get("body", "")).encode("utf-8")
+
+
+def build_response(
+    url: str, status_code: int, headers: dict[str, str], body: bytes
+) -> Any:
+    import requests
+    from requests.structures import CaseInsensitiveDict
+    from requests.utils import get_encoding_from_headers
+
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = url
+    response.headers = CaseInsensitiveDict(headers)
+    response.encoding = get_encoding_from_headers(response.headers)
+    response._content = body
+    return response
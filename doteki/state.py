@@ -0,0 +1,115 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any
+
+from doteki.cache import write_json_atomically
+
+
+def state_path(cache_dir: str, document_path: str) -> str:
+    # One state file per document, so several READMEs can share a cache directory.
+    key = hashlib.sha256(os.path.abspath(document_path).encode()).hexdigest()
+    return os.path.join(cache_dir, "state", f"{key[:16]}.json")
+
+
+def settings_hash(settings: dict[str, Any]) -> str:
+    canonical_settings = json.dumps(
+        settings, sort_keys=True, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(canonical_settings.encode()).hexdigest()
+
+
+def content_hash(regions: list[str]) -> str:
+    return hashlib.sha256("\0".join(regions).encode()).hexdigest()
+
+
+class RunState:
+    # What happened to each section of a document in previous runs: the settings
+    # and output it was rendered with, when it last succeeded, how long it took
+    # and how many times in a row it has failed.
+    def __init__(self, path: str):
+        self.path: str = path
+        self.sections: dict[str, dict[str, Any]] = {}
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                sections = json.load(file)["sections"]
+            if isinstance(sections, dict):
+                self.sections = sections
+        except FileNotFoundError:
+            pass
+        except (IOError, ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Ignoring unreadable run state {path}: {e}")
+
+    def stale_reason(
+        self,
+        section: str,
+        settings: dict[str, Any],
+        regions: list[str],
+        refresh: float,
+    ) -> str | None:
+        entry = self.sections.get(section)
+        if entry is None or entry.get("last_success") is None:
+            return "it never ran successfully"
+        if entry.get("settings_hash") != settings_hash(settings):
+            return "its settings changed"
+        if entry.get("failures"):
+            return "it failed last time"
+        if entry.get("output_hash") != content_hash(regions):
+            return "its content was edited"
+        if not refresh:
+            return "it has no refresh interval"
+        if time.time() - entry["last_success"] >= refresh:
+            return "its refresh interval elapsed"
+        return None
+
+    def due_at(
+        self,
+        section: str,
+        settings: dict[str, Any],
+        regions: list[str],
+        refresh: float,
+        retry_delay: float,
+    ) -> float:
+        # When the section next needs to run: right away if it changed since its
+        # last success, `retry_delay` after a failed attempt, and `refresh` after
+        # its last success otherwise.
+        entry = self.sections.get(section)
+        if entry is None:
+            return time.time()
+        if entry.get("last_success") is not None and (
+            entry.get("settings_hash") != settings_hash(settings)
+            or entry.get("output_hash") != content_hash(regions)
+        ):
+            return time.time()
+        if entry.get("failures"):
+            return float(entry.get("last_attempt", 0)) + retry_delay
+        if entry.get("last_success") is None:
+            return time.time()
+        return float(entry["last_success"]) + refresh
+
+    def record(
+        self,
+        section: str,
+        settings: dict[str, Any],
+        regions: list[str],
+        succeeded: bool,
+        duration: float,
+    ) -> None:
+        entry = self.sections.setdefault(section, {"last_success": None})
+        entry["last_duration"] = round(duration, 3)
+        entry["last_attempt"] = time.time()
+        if succeeded:
+            entry["settings_hash"] = settings_hash(settings)
+            entry["output_hash"] = content_hash(regions)
+            entry["last_success"] = time.time()
+            entry["failures"] = 0
+        else:
+            entry["failures"] = entry.get("failures", 0) + 1
+
+    def save(self) -> None:
+        try:
+            write_json_atomically(self.path, {"sections": self.sections})
+        except (IOError, TypeError, ValueError) as e:
+            logging.warning(f"Could not write run state {self.path}: {e}")
@@ -0,0 +1,143 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import time
+
+DEFAULT_POLL_INTERVAL = 1.0  # Seconds.
+# Editors often save in several steps (truncate, write, rename). Events closer
+# together than this are reported as a single change.
+SETTLE_TIME = 0.1
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = os.O_NONBLOCK
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, name length.
+
+
+class FileWatcher:
+    # Waits for changes to a set of files. On Linux it uses inotify, watching
+    # their directories so files replaced by a rename are still noticed.
+    # Elsewhere (or if inotify can't be set up) it polls their metadata.
+    def __init__(self, paths: list[str], poll_interval: float = DEFAULT_POLL_INTERVAL):
+        self.paths: list[str] = paths
+        self.poll_interval: float = poll_interval
+        self.snapshot: dict[str, tuple[int, int, int] | None] = self.stat_files()
+        self.inotify: Inotify | None = None
+        if sys.platform.startswith("linux"):
+            try:
+                self.inotify = Inotify(paths)
+            except OSError as e:
+                logging.warning(f"Could not use inotify ({e}). Polling for changes")
+
+    def wait(self, timeout: float | None = None) -> set[str]:
+        # Returns the paths that changed, or an empty set after `timeout` seconds.
+        if self.inotify is not None:
+            return self.inotify.wait(timeout)
+        started = time.monotonic()
+        while True:
+            snapshot = self.stat_files()
+            changed = {
+                path for path in self.paths if snapshot[path] != self.snapshot[path]
+            }
+            self.snapshot = snapshot
+            if changed:
+                return changed
+            remaining = None if timeout is None else timeout - elapsed(started)
+            if remaining is not None and remaining <= 0:
+                return set()
+            time.sleep(
+                self.poll_interval
+                if remaining is None
+                else min(self.poll_interval, remaining)
+            )
+
+    def stat_files(self) -> dict[str, tuple[int, int, int] | None]:
+        snapshot: dict[str, tuple[int, int, int] | None] = {}
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+            except OSError:
+                snapshot[path] = None
+        return snapshot
+
+    def close(self) -> None:
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+
+class Inotify:
+    # A thin ctypes wrapper around the inotify calls in libc.
+    def __init__(self, paths: list[str]):
+        library = ctypes.util.find_library("c")
+        if library is None:
+            raise OSError("libc not found")
+        self.libc = ctypes.CDLL(library, use_errno=True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError("inotify is not supported")
+        self.fd: int = self.libc.inotify_init1(IN_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # Watch descriptor -> file names in its directory -> watched paths.
+        self.watches: dict[int, dict[str, str]] = {}
+        try:
+            for path in paths:
+                directory, name = os.path.split(os.path.abspath(path))
+                descriptor = self.libc.inotify_add_watch(
+                    self.fd,
+                    os.fsencode(directory),
+                    IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE,
+                )
+                if descriptor < 0:
+                    raise OSError(ctypes.get_errno(), f"Can't watch {directory}")
+                self.watches.setdefault(descriptor, {})[name] = path
+        except OSError:
+            self.close()
+            raise
+
+    def wait(self, timeout: float | None) -> set[str]:
+        started = time.monotonic()
+        changed: set[str] = set()
+        # Events for other files in the same directories are skipped.
+        while not changed:
+            remaining = None if timeout is None else timeout - elapsed(started)
+            if remaining is not None and remaining <= 0:
+                return set()
+            changed = self.read_events(remaining)
+        while more := self.read_events(SETTLE_TIME):
+            changed |= more
+        return changed
+
+    def read_events(self, timeout: float | None) -> set[str]:
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            descriptor, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            path = self.watches.get(descriptor, {}).get(os.fsdecode(name))
+            if path is not None:
+                changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def elapsed(started: float) -> float:
+    return time.monotonic() - started
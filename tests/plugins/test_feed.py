@@ -4,9 +4,9 @@ from unittest.mock import MagicMock, patch
 import pytest
 import requests
 
-from doteki.plugins.feed import run, validate_settings
+from doteki.plugins.feed import endpoint, run, validate_settings
 
-MOCK_YOUTUBE_FEED_XML = """<?xml version="1.0" encoding="UTF-8"?>
+MOCK_YOUTUBE_FEED_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
 <feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" xmlns:media="http://search.yahoo.com/mrss/" xmlns="http://www.w3.org/2005/Atom">
  <link rel="self" href="http://www.youtube.com/feeds/videos.xml?channel_id=UCSample12345"/>
  <id>yt:channel:UCSample12345</id>
@@ -93,7 +93,7 @@ MOCK_YOUTUBE_FEED_XML = """<?xml version="1.0" encoding="UTF-8"?>
 </feed>
 """
 
-MOCK_ATOM_FEED_XML = """<?xml version="1.0" encoding="utf-8"?>
+MOCK_ATOM_FEED_XML = b"""<?xml version="1.0" encoding="utf-8"?>
 <feed xmlns="http://www.w3.org/2005/Atom">
     <title>Example Tech Blog</title>
     <subtitle>Exploring Technology and Programming</subtitle>
@@ -153,7 +153,7 @@ MOCK_ATOM_FEED_XML = """<?xml version="1.0" encoding="utf-8"?>
 """
 
 
-@patch("requests.get")
+@patch("doteki.http.get")
 def test_youtube_feed(mock_get):
     # Create a mock response object.
     mock_response = MagicMock()
@@ -178,7 +178,7 @@ def test_youtube_feed(mock_get):
     )
 
 
-@patch("requests.get")
+@patch("doteki.http.get")
 def test_atom_feed(mock_get):
     # Create a mock response.
     mock_response = MagicMock()
@@ -219,9 +219,9 @@ def test_invalid_url(caplog):
 
 def test_empty_response(caplog):
     mock_response = MagicMock()
-    mock_response.content = ""
+    mock_response.content = b""
     mock_response.raise_for_status = MagicMock()
-    with patch("requests.get", return_value=mock_response):
+    with patch("doteki.http.get", return_value=mock_response):
         settings = {"url": "https://example.com/atom.xml"}
         with caplog.at_level(logging.ERROR):
             result = run(settings)
@@ -233,7 +233,7 @@ def test_malformed_feed(caplog):
     mock_response = MagicMock()
     mock_response.content = b"Not a valid feed content"
     mock_response.raise_for_status = MagicMock()
-    with patch("requests.get", return_value=mock_response):
+    with patch("doteki.http.get", return_value=mock_response):
         settings = {"url": "https://example.com/atom.xml"}
         with caplog.at_level(logging.ERROR):
             result = run(settings)
@@ -241,7 +241,7 @@ def test_malformed_feed(caplog):
         assert "Malformed feed: no entries found" in caplog.text
 
 
-@patch("requests.get")
+@patch("doteki.http.get")
 @patch("feedparser.parse")
 def test_error_processing_feed(mock_parse, mock_get, caplog):
     # Configure mock_parse to raise an exception.
@@ -270,7 +270,7 @@ def test_error_processing_feed(mock_parse, mock_get, caplog):
         requests.exceptions.HTTPError,
     ],
 )
-@patch("requests.get")
+@patch("doteki.http.get")
 def test_request_exceptions(mock_get, caplog, exception):
     mock_get.side_effect = exception
     settings = {"url": "https://example.com/atom.xml"}
@@ -300,7 +300,7 @@ MOCK_FEED_WITH_MISSING_DATA = b"""
 @pytest.mark.filterwarnings(
     "ignore:To avoid breaking existing software:DeprecationWarning"
 )
-@patch("requests.get")
+@patch("doteki.http.get")
 def test_feed_with_missing_data(mock_get, caplog):
     # Mock response with the feed having an entry missing a title
     mock_response = MagicMock()
@@ -359,7 +359,7 @@ MOCK_FEED_MISSING_DATE = b"""
 @pytest.mark.filterwarnings(
     "ignore:To avoid breaking existing software:DeprecationWarning"
 )
-@patch("requests.get")
+@patch("doteki.http.get")
 def test_feed_missing_date(mock_get, caplog):
     mock_response = MagicMock()
     mock_response.content = MOCK_FEED_MISSING_DATE
@@ -379,7 +379,7 @@ def test_feed_missing_date(mock_get, caplog):
     assert result == expected_output
 
 
-@patch("requests.get")
+@patch("doteki.http.get")
 def test_n_one_returns_str(mock_get):
     mock_response = MagicMock()
     mock_response.content = MOCK_FEED_MISSING_DATE
@@ -394,7 +394,7 @@ def test_n_one_returns_str(mock_get):
     assert isinstance(result, str)
 
 
-@patch("requests.get")
+@patch("doteki.http.get")
 def test_sort_by_published_date(mock_get):
     mock_response = MagicMock()
     mock_response.content = MOCK_ATOM_FEED_XML
@@ -418,7 +418,7 @@ def test_sort_by_published_date(mock_get):
     assert result[-1].startswith("[Artificial Intelligence Ethics")  # Oldest
 
 
-@patch("requests.get")
+@patch("doteki.http.get")
 def test_sort_by_updated_date(mock_get):
     mock_response = MagicMock()
     mock_response.content = MOCK_ATOM_FEED_XML
@@ -461,7 +461,7 @@ MOCK_FEED_MIXED_DATES = b"""
 @pytest.mark.filterwarnings(
     "ignore:To avoid breaking existing software:DeprecationWarning"
 )
-@patch("requests.get")
+@patch("doteki.http.get")
 def test_sort_with_mixed_dates(mock_get):
     mock_response = MagicMock()
     mock_response.content = MOCK_FEED_MIXED_DATES
@@ -532,7 +532,7 @@ MOCK_FEED_UPDATED_FALLBACK = b"""
 @pytest.mark.filterwarnings(
     "ignore:To avoid breaking existing software:DeprecationWarning"
 )
-@patch("requests.get")
+@patch("doteki.http.get")
 def test_sort_updated_fallback(mock_get):
     mock_response = MagicMock()
     mock_response.content = MOCK_FEED_UPDATED_FALLBACK
@@ -583,7 +583,7 @@ MOCK_FEED_NO_DATES = b"""
 """
 
 
-@patch("requests.get")
+@patch("doteki.http.get")
 def test_sort_with_missing_all_dates(mock_get, caplog):
     mock_response = MagicMock()
     mock_response.content = MOCK_FEED_NO_DATES
@@ -609,3 +609,9 @@ def test_sort_with_missing_all_dates(mock_get, caplog):
     assert result[0].startswith("[Entry 3")  # Jan 3
     assert result[1].startswith("[Entry 1")  # Jan 1
     assert result[2].startswith("[Entry 2")  # No date -> should be last in descending
+
+
+def test_endpoint():
+    assert endpoint({"url": "https://example.com/atom.xml"}) == (
+        "https://example.com/atom.xml"
+    )
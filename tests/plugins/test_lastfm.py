@@ -50,7 +50,7 @@ def test_no_username(caplog):
         "period": "7day",
         "n": 3,
     }
-    with patch("requests.get") as mock_get:
+    with patch("doteki.http.get") as mock_get:
         result = run(settings)
         assert result is None
         assert "No 'username' provided for lastfm plugin" in caplog.text
@@ -109,7 +109,7 @@ def test_default_period_used():
         "type": "artists",
         "n": 3,
     }
-    with patch("requests.get") as mock_get:
+    with patch("doteki.http.get") as mock_get:
         run(settings)
         assert f"&period={'7day'}" in mock_get.call_args[0][0]
 
@@ -141,7 +141,7 @@ def test_log_multiple_settings_errors(caplog):
         requests.exceptions.HTTPError,
     ],
 )
-@patch("requests.get")
+@patch("doteki.http.get")
 def test_lastfm_request_exceptions(mock_get, caplog, exception):
     mock_get.side_effect = exception
     settings = {
@@ -162,7 +162,7 @@ MOCK_ARTIST_JSON = """{"topartists":{"artist":[{"name":"Frankie Cosmos","playcou
 
 
 @patch.dict(os.environ, {"DOTEKI_LASTFM_API_KEY": "mock_api_key"})
-@patch("requests.get")
+@patch("doteki.http.get")
 def test_successful_lastfm_response(mock_get):
     mock_response = Mock()
     mock_response.json.return_value = json.loads(MOCK_ARTIST_JSON)
@@ -186,7 +186,7 @@ def test_successful_lastfm_response(mock_get):
 
 
 @patch.dict(os.environ, {"DOTEKI_LASTFM_API_KEY": "mock_api_key"})
-@patch("requests.get")
+@patch("doteki.http.get")
 def test_lastfm_response_single_item_is_str(mock_get):
     mock_response = Mock()
     mock_response.json.return_value = json.loads(MOCK_ARTIST_JSON)
@@ -214,7 +214,7 @@ def test_format_item_without_links():
 
 
 @patch.dict(os.environ, {}, clear=True)
-@patch("requests.get")
+@patch("doteki.http.get")
 def test_missing_api_key_warning(mock_get, caplog):
     mock_response = {
         "topartists": {
@@ -238,7 +238,7 @@ def test_missing_api_key_warning(mock_get, caplog):
 
 
 @patch.dict(os.environ, {"DOTEKI_LASTFM_API_KEY": "SECRET_API_KEY"})
-@patch("requests.get")
+@patch("doteki.http.get")
 def test_api_key_hidden_in_error_message(mock_get, caplog):
     mock_get.side_effect = requests.exceptions.RequestException(
         "Error message containing SECRET_API_KEY"
@@ -261,7 +261,7 @@ MOCK_ALBUM_JSON = """{"topalbums":{"album":[{"name":"Hexada","playcount":123,"mb
 
 
 @patch.dict(os.environ, {"DOTEKI_LASTFM_API_KEY": "mock_api_key"})
-@patch("requests.get")
+@patch("doteki.http.get")
 def test_successful_album_response(mock_get):
     mock_response = Mock()
     mock_response.json.return_value = json.loads(MOCK_ALBUM_JSON)
@@ -308,7 +308,7 @@ def test_format_item_album_without_links():
 def test_empty_artist_list_logs_warning(caplog):
     empty_artist_json = """{"topartists": {"artist": [], "@attr": {"user": "username", "totalPages": "0", "page": "1", "perPage": "50", "total": "0"}}}"""
 
-    with patch("requests.get") as mock_get:
+    with patch("doteki.http.get") as mock_get:
         mock_response = Mock()
         mock_response.json.return_value = json.loads(empty_artist_json)
         mock_get.return_value = mock_response
@@ -330,7 +330,7 @@ def test_empty_artist_list_logs_warning(caplog):
 def test_missing_top_artists_key(caplog):
     incomplete_json = """{"someOtherKey": {"data": []}}"""
 
-    with patch("requests.get") as mock_get:
+    with patch("doteki.http.get") as mock_get:
         mock_response = Mock()
         mock_response.json.return_value = json.loads(incomplete_json)
         mock_get.return_value = mock_response
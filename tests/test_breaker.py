@@ -0,0 +1,76 @@
+from unittest.mock import patch
+
+from doteki.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreakers
+
+
+def fail(breakers, key="feed:https://example.com", threshold=2, cooldown=60):
+    breakers.record_failure(key, "feed", "https://example.com", threshold, cooldown)
+
+
+def test_breaker_opens_after_threshold(tmp_path):
+    breakers = CircuitBreakers(str(tmp_path))
+    fail(breakers)
+    assert breakers.state("feed:https://example.com").state == CLOSED
+    assert breakers.allows("feed:https://example.com")
+    fail(breakers)
+    state = breakers.state("feed:https://example.com")
+    assert state.state == OPEN
+    assert state.failures == 2
+    assert 0 < state.retry_in <= 60
+    assert not breakers.allows("feed:https://example.com")
+
+
+def test_breaker_half_opens_after_cooldown(tmp_path):
+    breakers = CircuitBreakers(str(tmp_path))
+    with patch("time.time", return_value=1000):
+        fail(breakers)
+        fail(breakers)
+    with patch("time.time", return_value=1061):
+        assert breakers.state("feed:https://example.com").state == HALF_OPEN
+        assert breakers.allows("feed:https://example.com")
+        # A failed trial call opens it for another cooldown.
+        fail(breakers)
+        assert breakers.state("feed:https://example.com").state == OPEN
+
+
+def test_breaker_closes_on_success(tmp_path):
+    breakers = CircuitBreakers(str(tmp_path))
+    fail(breakers)
+    fail(breakers)
+    breakers.record_success("feed:https://example.com")
+    assert breakers.state("feed:https://example.com") is None
+    assert breakers.tripped() == []
+
+
+def test_breaker_state_is_persisted(tmp_path):
+    breakers = CircuitBreakers(str(tmp_path))
+    fail(breakers)
+    fail(breakers)
+    breakers.save()
+
+    reloaded = CircuitBreakers(str(tmp_path))
+    assert [state.endpoint for state in reloaded.tripped()] == ["https://example.com"]
+
+
+def test_breaker_ignores_corrupt_state(tmp_path, caplog):
+    (tmp_path / "breakers.json").write_text("{not json", encoding="utf-8")
+    breakers = CircuitBreakers(str(tmp_path))
+    assert breakers.allows("feed:https://example.com")
+    assert "Ignoring unreadable breaker state" in caplog.text
+
+
+def test_breaker_save_error(tmp_path, caplog):
+    blocker = tmp_path / "blocker"
+    blocker.write_text("Not a directory", encoding="utf-8")
+    breakers = CircuitBreakers(str(blocker))
+    fail(breakers)
+    breakers.save()
+    assert "Could not write breaker state" in caplog.text
+
+
+def test_read_only_breakers_are_not_saved(tmp_path):
+    breakers = CircuitBreakers(str(tmp_path), read_only=True)
+    fail(breakers, threshold=1)
+    assert not breakers.allows("feed:https://example.com")
+    breakers.save()
+    assert list(tmp_path.iterdir()) == []
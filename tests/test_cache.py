@@ -0,0 +1,112 @@
+import os
+import time
+from unittest.mock import patch
+
+from doteki.cache import HttpCache, OutputCache, cache_key, default_cache_dir
+
+
+def test_output_cache_round_trip(tmp_path):
+    cache = OutputCache(str(tmp_path))
+    assert cache.get("abc123") is None
+    cache.set("abc123", "feed", ["one", "two"])
+    entry = cache.get("abc123")
+    assert entry.output == ["one", "two"]
+    assert 0 <= entry.age() < 5
+
+
+def test_output_cache_ignores_corrupt_entries(tmp_path, caplog):
+    cache = OutputCache(str(tmp_path))
+    cache.set("abc123", "feed", "output")
+    with open(cache.path("abc123"), "w", encoding="utf-8") as file:
+        file.write("{not json")
+    assert cache.get("abc123") is None
+    assert "Ignoring unreadable cache entry" in caplog.text
+
+
+def test_output_cache_write_error(tmp_path, caplog):
+    blocker = tmp_path / "blocker"
+    blocker.write_text("Not a directory", encoding="utf-8")
+    cache = OutputCache(str(blocker))
+    cache.set("abc123", "feed", "output")
+    assert "Could not write cache entry" in caplog.text
+
+
+def test_output_cache_entry_age(tmp_path):
+    cache = OutputCache(str(tmp_path))
+    with patch("time.time", return_value=1000):
+        cache.set("abc123", "feed", "output")
+    assert cache.get("abc123").created == 1000
+    assert cache.get("abc123").age() > time.time() - 1001
+
+
+def test_cache_key_depends_on_secrets_without_storing_them(monkeypatch, tmp_path):
+    monkeypatch.setenv("DOTEKI_LASTFM_API_KEY", "first-secret")
+    first_key = cache_key("lastfm", "invocation")
+    monkeypatch.setenv("DOTEKI_LASTFM_API_KEY", "second-secret")
+    second_key = cache_key("lastfm", "invocation")
+    assert first_key != second_key
+
+    cache = OutputCache(str(tmp_path))
+    cache.set(second_key, "lastfm", "output")
+    for path in tmp_path.rglob("*"):
+        assert "second-secret" not in path.name
+        if path.is_file():
+            assert "second-secret" not in path.read_text(encoding="utf-8")
+
+
+def test_cache_key_ignores_other_plugins_secrets(monkeypatch):
+    first_key = cache_key("feed", "invocation")
+    monkeypatch.setenv("DOTEKI_LASTFM_API_KEY", "secret")
+    assert cache_key("feed", "invocation") == first_key
+
+
+def test_default_cache_dir(monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", "/tmp/cache-home")
+    assert default_cache_dir() == "/tmp/cache-home/doteki"
+
+
+def test_http_cache_round_trip(tmp_path):
+    cache = HttpCache(str(tmp_path), 1024, 3600)
+    cache.set("https://example.com/?api_key=secret", {"ETag": '"v1"'}, b"body\nmore")
+    entry = cache.get("https://example.com/?api_key=secret")
+    assert entry.body == b"body\nmore"
+    assert entry.validators() == {"If-None-Match": '"v1"'}
+    stored = list((tmp_path / "http").rglob("*.http"))
+    assert b"secret" not in stored[0].read_bytes()
+
+
+def test_http_cache_expires_unused_entries(tmp_path):
+    cache = HttpCache(str(tmp_path), 1024, 3600)
+    cache.set("https://example.com/", {"ETag": '"v1"'}, b"body")
+    with patch("time.time", return_value=time.time() + 3601):
+        assert cache.get("https://example.com/") is None
+        cache.prune()
+    assert not os.path.exists(cache.path("https://example.com/"))
+
+
+def test_http_cache_prunes_least_recently_used(tmp_path):
+    cache = HttpCache(str(tmp_path), 100, 3600)
+    for age, url in [(30, "https://a/"), (20, "https://b/"), (10, "https://c/")]:
+        cache.set(url, {}, b"x" * 40)
+        modified = time.time() - age
+        os.utime(cache.path(url), (modified, modified))
+    cache.touch("https://a/")
+    cache.prune()
+    kept = [url for url in ("https://a/", "https://b/", "https://c/") if cache.get(url)]
+    assert kept == ["https://a/", "https://c/"]
+
+
+def test_http_cache_skips_bodies_over_the_limit(tmp_path):
+    cache = HttpCache(str(tmp_path), 10, 3600)
+    cache.set("https://example.com/", {"ETag": '"v1"'}, b"x" * 11)
+    assert cache.get("https://example.com/") is None
+
+
+def test_read_only_caches_are_not_written(tmp_path):
+    cache = OutputCache(str(tmp_path), read_only=True)
+    cache.set("abcd", "figlet", "output")
+    assert cache.get("abcd") is None
+    http_cache = HttpCache(str(tmp_path), 1024, 3600, read_only=True)
+    http_cache.set("https://example.com", {"ETag": '"v1"'}, b"body")
+    assert http_cache.get("https://example.com") is None
+    assert list(tmp_path.iterdir()) == []
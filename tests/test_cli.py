@@ -1,24 +1,42 @@
+import asyncio
 import logging
 import sys
+import threading
+import time
+from types import SimpleNamespace
 from unittest.mock import MagicMock, Mock, mock_open, patch
 
 import pytest
 
+from doteki.cache import OutputCache, cache_key
 from doteki.cli import (
     DEFAULT_CREDITS,
+    DEFAULT_MARKER_FORMAT,
+    Document,
+    RunContext,
     SectionContext,
     find_section_indices,
+    finish_run,
     format_bullet_list,
     format_comma_and,
     format_glue,
     format_numbered_list,
     format_space,
+    get_http_client,
+    get_jobs,
+    get_plugin_endpoint,
     get_plugin_output,
+    index_section_markers,
+    invocation_key,
     load_config,
     main,
+    parse_arguments,
+    process_sections,
+    read_config,
     read_file_content,
     replace_section_content,
     update_readme_content,
+    without_sections,
     write_file_content,
 )
 
@@ -83,10 +101,9 @@ def test_load_valid_config_adds_credits():
 
 
 def test_update_readme_no_plugin_specified(caplog):
-    section_context = SectionContext("test_section", {}, "README.md")
-    global_config = {}
+    section_context = SectionContext("test_section", {}, [(0, 0)])
     with caplog.at_level(logging.ERROR):
-        update_readme_content(section_context, global_config)
+        asyncio.run(update_readme_content(section_context, Document("Untouched")))
     assert "No plugin specified for section 'test_section'" in caplog.text
 
 
@@ -97,25 +114,18 @@ def readme_file(tmp_path):
     return readme_path
 
 
-def test_update_readme_content_no_plugin_specified(caplog):
+@patch("doteki.cli.get_plugin_output", return_value="2053-12-31")
+def test_update_readme_content_runs_plugin_per_marker_pair(mock_get_plugin_output):
     section_context = SectionContext(
-        name="test_section", settings={}, readme_path="README.md"
+        "mock", {"plugin": "current_date", "inline": True}, [(5, 10), (20, 30)]
     )
-    global_config = {}
-    with caplog.at_level(logging.ERROR):
-        update_readme_content(section_context, global_config)
-    assert "No plugin specified for section 'test_section'" in caplog.text
-
-
-@patch("doteki.cli.read_file_content")
-def test_readme_content_read(mock_read_file_content, readme_file):
-    mock_read_file_content.return_value = readme_file.read_text(encoding="utf-8")
-    section_context = SectionContext(
-        "test_section", {"plugin": "test_plugin"}, str(readme_file)
-    )
-    global_config = {}
-    update_readme_content(section_context, global_config)
-    mock_read_file_content.assert_called_once_with(str(readme_file))
+    document = Document("x" * 40)
+    asyncio.run(update_readme_content(section_context, document))
+    assert document.replacements == {
+        5: (10, "2053-12-31"),
+        20: (30, "2053-12-31"),
+    }
+    assert mock_get_plugin_output.call_count == 2
 
 
 def test_read_file_content_io_error(caplog):
@@ -148,39 +158,113 @@ def test_find_section_indices_mismatched_markers(caplog):
 
 
 @patch("doteki.cli.get_plugin_output", return_value=None)
-@patch("doteki.cli.find_section_indices", return_value=[(0, 10)])
-@patch("doteki.cli.read_file_content")
-def test_handle_none_plugin_output(
-    mock_read_file_content,
-    mock_find_section_indices,
-    mock_get_plugin_output,
-    caplog,
-    readme_file,
-):
-    mock_read_file_content.return_value = readme_file.read_text(encoding="utf-8")
+def test_handle_none_plugin_output(mock_get_plugin_output, caplog):
     section_context = SectionContext(
-        "test_section", {"plugin": "test_plugin"}, str(readme_file)
+        "test_section", {"plugin": "test_plugin"}, [(0, 10)]
     )
-    global_config = {}
     with caplog.at_level(logging.ERROR):
-        update_readme_content(section_context, global_config)
+        document = Document("Untouched content")
+        asyncio.run(update_readme_content(section_context, document))
+    assert document.render() == "Untouched content"
     assert (
         "No content returned by plugin 'test_plugin' for section 'test_section'"
         in caplog.text
     )
 
 
+def test_index_section_markers_single_pass():
+    content = (
+        "<!-- blog start -->old<!-- blog end -->\n"
+        "<!-- blog2 start --><!-- blog2 end -->\n"
+        "<!-- blog start -->older<!-- blog end -->"
+    )
+    marker_index = index_section_markers(
+        content, ["blog", "blog2"], DEFAULT_MARKER_FORMAT
+    )
+    first_start = content.index("old")
+    second_start = content.index("older")
+    assert marker_index == {
+        "blog": [
+            (first_start, first_start + 3),
+            (second_start, second_start + 5),
+        ],
+        "blog2": [(content.index("<!-- blog2 end -->"),) * 2],
+    }
+
+
+def test_index_section_markers_custom_format_with_name_first():
+    content = "[[blog:start]]old[[blog:end]]"
+    marker_index = index_section_markers(content, ["blog"], "[[{name}:{position}]]")
+    assert marker_index == {"blog": [(14, 17)]}
+
+
+def test_index_section_markers_requires_placeholders():
+    with pytest.raises(ValueError):
+        index_section_markers("<!-- blog -->", ["blog"], "<!-- {name} -->")
+
+
+def test_index_section_markers_missing_markers(caplog):
+    with caplog.at_level(logging.ERROR):
+        marker_index = index_section_markers(
+            "No markers here", ["blog"], DEFAULT_MARKER_FORMAT
+        )
+    assert marker_index == {"blog": []}
+    assert "No markers found for section 'blog'" in caplog.text
+
+
+def test_index_section_markers_end_before_start(caplog):
+    content = "<!-- blog end --><!-- blog start -->"
+    with caplog.at_level(logging.ERROR):
+        marker_index = index_section_markers(content, ["blog"], DEFAULT_MARKER_FORMAT)
+    assert marker_index == {"blog": []}
+    assert "Mismatched markers for section 'blog'" in caplog.text
+
+
+def test_index_section_markers_nested_sections(caplog):
+    content = "<!-- a start --><!-- b start --><!-- b end --><!-- a end -->"
+    with caplog.at_level(logging.ERROR):
+        marker_index = index_section_markers(content, ["a", "b"], DEFAULT_MARKER_FORMAT)
+    assert marker_index["a"] == [(16, content.index("<!-- a end -->"))]
+    assert marker_index["b"] == []
+    assert "Markers for section 'b' are nested inside section 'a'" in caplog.text
+
+
+def test_index_section_markers_overlapping_sections(caplog):
+    content = "<!-- a start --><!-- b start --><!-- a end --><!-- b end -->"
+    with caplog.at_level(logging.ERROR):
+        marker_index = index_section_markers(content, ["a", "b"], DEFAULT_MARKER_FORMAT)
+    assert marker_index["a"] != []
+    assert marker_index["b"] == []
+    assert "Markers for sections 'a' and 'b' overlap" in caplog.text
+
+
+def test_process_sections_keeps_indices_valid_across_sections():
+    global_config = {
+        "sections": {
+            "b": {"plugin": "current_date", "inline": True},
+            "a": {"plugin": "current_date"},
+        }
+    }
+    content = "<!-- a start -->x<!-- a end --> <!-- b start -->y<!-- b end -->"
+    with patch("doteki.plugins.current_date.run", return_value="2053-12-31"):
+        updated_content = process_sections(global_config, content)
+    assert updated_content == (
+        "<!-- a start -->\n2053-12-31\n<!-- a end --> "
+        "<!-- b start -->2053-12-31<!-- b end -->"
+    )
+
+
 def test_get_plugin_output_import_error(caplog):
     plugin_name = "nonexistent_plugin"
     with patch("importlib.import_module", side_effect=ImportError("mocked error")):
-        assert get_plugin_output(plugin_name, {}) is None
+        assert asyncio.run(get_plugin_output(plugin_name, {})) is None
         assert f"Missing dependency for plugin '{plugin_name}'" in caplog.text
 
 
 def test_get_plugin_output_attribute_error(caplog):
     plugin_name = "incomplete_plugin"
     with patch("importlib.import_module", return_value=Mock(spec=[])):
-        assert get_plugin_output(plugin_name, {}) is None
+        assert asyncio.run(get_plugin_output(plugin_name, {})) is None
         assert f"Plugin '{plugin_name}' does not have a 'run' function" in caplog.text
 
 
@@ -190,7 +274,7 @@ def test_get_plugin_output_general_exception(caplog):
         "importlib.import_module",
         return_value=Mock(run=Mock(side_effect=Exception("mocked error"))),
     ):
-        assert get_plugin_output(plugin_name, {}) is None
+        assert asyncio.run(get_plugin_output(plugin_name, {})) is None
         assert f"An error occurred in plugin '{plugin_name}'" in caplog.text
 
 
@@ -294,21 +378,50 @@ def test_replace_section_content():
     end_index = start_index + len("Hello")
     new_content = "Goodbye"
 
-    updated_content = replace_section_content(
-        original_content, new_content, start_index, end_index, inline=True
-    )
+    document = Document(original_content)
+    replace_section_content(document, new_content, start_index, end_index, inline=True)
 
     expected_content = "<!-- section start -->Goodbye<!-- section end -->, world"
-    assert updated_content == expected_content
+    assert document.render() == expected_content
 
 
-def test_write_file_content_ioerror(caplog):
-    filepath = "test_file.txt"
+def test_replace_section_content_block():
+    document = Document("<!-- a start -->Hello<!-- a end -->")
+    replace_section_content(document, "Goodbye", 16, 21, inline=False)
+    assert document.render() == "<!-- a start -->\nGoodbye\n<!-- a end -->"
+
+
+def test_document_renders_replacements_in_order():
+    document = Document("0123456789")
+    document.replace(6, 8, "b")
+    document.replace(1, 3, "a")
+    assert list(document.chunks()) == ["0", "a", "345", "b", "89"]
+    assert document.render() == "0a345b89"
+
+
+def test_document_without_replacements():
+    assert Document("Unchanged").render() == "Unchanged"
+
+
+def test_write_file_content_ioerror(caplog, tmp_path):
+    filepath = tmp_path / "test_file.txt"
     content = "Test content"
     with patch("builtins.open", mock_open()) as mock_file:
         mock_file.side_effect = IOError("Mocked IOError")
-        write_file_content(filepath, content)
+        assert write_file_content(str(filepath), content) is False
         assert f"An error occurred while writing to {filepath}" in caplog.text
+    # The temporary file is cleaned up.
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_write_file_content_replaces_file_and_keeps_mode(tmp_path):
+    filepath = tmp_path / "README.md"
+    filepath.write_text("Old content", encoding="utf-8")
+    filepath.chmod(0o644)
+    assert write_file_content(str(filepath), "New content") is True
+    assert filepath.read_text(encoding="utf-8") == "New content"
+    assert filepath.stat().st_mode & 0o777 == 0o644
+    assert list(tmp_path.iterdir()) == [filepath]
 
 
 def test_main_functionality_inline(tmp_path):
@@ -512,16 +625,951 @@ def test_main_exception_handling(caplog, tmp_path):
     config_path.write_text("[sections]\n", encoding="utf-8")
     readme_path.write_text("Initial README content", encoding="utf-8")
 
-    mock_args = MagicMock(input=str(readme_path), config=str(config_path))
+    mock_args = MagicMock(input=str(readme_path), config=str(config_path), watch=False)
 
     # Mock the main process to raise an exception.
     with patch("doteki.cli.parse_arguments", return_value=mock_args), patch(
         "doteki.cli.process_sections", side_effect=Exception("Test Exception")
-    ), patch("os.remove") as mock_remove, patch("sys.exit") as mock_exit:
+    ), patch("doteki.cli.write_file_content") as mock_write, patch(
+        "sys.exit", side_effect=SystemExit
+    ) as mock_exit:
 
         with caplog.at_level(logging.ERROR):
-            main()
+            with pytest.raises(SystemExit):
+                main()
 
     assert "An error occurred: Test Exception" in caplog.text
-    assert mock_remove.called  # Tried to remove the temporary file.
+    mock_write.assert_not_called()
     mock_exit.assert_called_once_with(1)
+    assert readme_path.read_text(encoding="utf-8") == "Initial README content"
+
+
+def test_main_writes_once(tmp_path):
+    readme_file = tmp_path / "README.md"
+    config_file = tmp_path / "config.toml"
+    readme_file.write_text(
+        "<!-- a start --><!-- a end -->\n<!-- b start --><!-- b end -->",
+        encoding="utf-8",
+    )
+    config_file.write_text(
+        """
+    [sections.a]
+    plugin = "current_date"
+    inline = true
+
+    [sections.b]
+    plugin = "current_date"
+    inline = true
+    """,
+        encoding="utf-8",
+    )
+
+    test_args = ["doteki", "-c", str(config_file), "-i", str(readme_file)]
+    with patch.object(sys, "argv", test_args), patch(
+        "doteki.plugins.current_date.run", return_value="2053-12-31"
+    ), patch("doteki.cli.write_file_content", return_value=True) as mock_write:
+        main()
+
+    mock_write.assert_called_once()
+    written_path, written_content = mock_write.call_args.args
+    assert written_path == str(readme_file)
+    assert written_content.startswith(
+        "<!-- a start -->2053-12-31<!-- a end -->\n<!-- b start -->2053-12-31<!-- b end -->"
+    )
+    assert DEFAULT_CREDITS in written_content
+
+
+def test_process_sections_with_jobs_matches_sequential_run():
+    content = "".join(f"<!-- s{i} start -->old<!-- s{i} end -->\n" for i in range(20))
+    sections = {
+        f"s{i}": {"plugin": "random_choice", "options": [f"option {i}"]}
+        for i in range(20)
+    }
+    sequential = process_sections({"sections": sections}, content)
+    concurrent = process_sections({"sections": sections, "jobs": 8}, content)
+    assert concurrent == sequential
+    assert "option 19" in concurrent
+
+
+def test_process_sections_runs_sections_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+
+    def wait_for_other_section(settings):
+        barrier.wait()
+        return settings["options"][0]
+
+    content = "<!-- a start --><!-- a end --><!-- b start --><!-- b end -->"
+    sections = {
+        "a": {"plugin": "random_choice", "options": ["A"], "inline": True},
+        "b": {"plugin": "random_choice", "options": ["B"], "inline": True},
+    }
+    with patch("doteki.plugins.random_choice.run", wait_for_other_section):
+        updated_content = process_sections({"sections": sections, "jobs": 2}, content)
+    assert (
+        updated_content
+        == "<!-- a start -->A<!-- a end --><!-- b start -->B<!-- b end -->"
+    )
+
+
+def test_process_sections_isolates_errors_with_jobs(caplog):
+    content = "<!-- a start -->old<!-- a end --><!-- b start -->old<!-- b end -->"
+    sections = {
+        "a": {"plugin": "random_choice", "inline": True},
+        "b": {"plugin": "random_choice", "options": ["B"], "inline": True},
+    }
+    with caplog.at_level(logging.ERROR):
+        updated_content = process_sections({"sections": sections, "jobs": 2}, content)
+    assert (
+        updated_content
+        == "<!-- a start -->old<!-- a end --><!-- b start -->B<!-- b end -->"
+    )
+    assert (
+        "No content returned by plugin 'random_choice' for section 'a'" in caplog.text
+    )
+
+
+@pytest.mark.parametrize("jobs", [0, -1, "2", True])
+def test_get_jobs_invalid_value(jobs, caplog):
+    with caplog.at_level(logging.ERROR):
+        assert get_jobs({"jobs": jobs}) == 1
+    assert f"Invalid value for jobs: '{jobs}'" in caplog.text
+
+
+def test_main_jobs_argument_overrides_config(tmp_path):
+    readme_file = tmp_path / "README.md"
+    config_file = tmp_path / "config.toml"
+    readme_file.write_text("<!-- mock start --><!-- mock end -->", encoding="utf-8")
+    config_file.write_text(
+        """
+    jobs = 2
+    [sections.mock]
+    plugin = "current_date"
+    """,
+        encoding="utf-8",
+    )
+
+    test_args = ["doteki", "-c", str(config_file), "-i", str(readme_file), "-j", "4"]
+    with patch.object(sys, "argv", test_args), patch(
+        "doteki.cli.process_sections", return_value=""
+    ) as mock_process_sections:
+        main()
+
+    global_config = mock_process_sections.call_args.args[0]
+    assert global_config["jobs"] == 4
+
+
+def test_get_plugin_output_async_plugin():
+    async def run(settings):
+        await asyncio.sleep(0)
+        return ["one", "two"]
+
+    with patch("importlib.import_module", return_value=SimpleNamespace(run=run)):
+        output = asyncio.run(get_plugin_output("async_plugin", {"preset": "space"}))
+    assert output == "one two"
+
+
+def test_get_plugin_output_runs_sync_plugin_in_thread():
+    def run(settings):
+        return threading.current_thread().name
+
+    with patch("importlib.import_module", return_value=SimpleNamespace(run=run)):
+        output = asyncio.run(get_plugin_output("sync_plugin", {}))
+    assert output != threading.current_thread().name
+
+
+def test_get_plugin_output_async_plugin_exception(caplog):
+    async def run(settings):
+        raise ValueError("mocked error")
+
+    with patch("importlib.import_module", return_value=SimpleNamespace(run=run)):
+        assert asyncio.run(get_plugin_output("async_plugin", {})) is None
+    assert "An error occurred in plugin 'async_plugin': mocked error" in caplog.text
+
+
+def test_process_sections_overlaps_async_plugins_on_one_loop():
+    loops = set()
+    started = []
+
+    async def run(settings):
+        loops.add(asyncio.get_running_loop())
+        started.append(settings["name"])
+        # Both sections must have started before either can finish.
+        while len(started) < 2:
+            await asyncio.sleep(0.01)
+        return settings["name"]
+
+    content = "<!-- a start --><!-- a end --><!-- b start --><!-- b end -->"
+    sections = {
+        "a": {"plugin": "async_plugin", "name": "A", "inline": True},
+        "b": {"plugin": "async_plugin", "name": "B", "inline": True},
+    }
+    with patch("importlib.import_module", return_value=SimpleNamespace(run=run)):
+        updated_content = asyncio.run(
+            asyncio.wait_for(
+                asyncio.to_thread(
+                    process_sections, {"sections": sections, "jobs": 2}, content
+                ),
+                timeout=5,
+            )
+        )
+    assert (
+        updated_content
+        == "<!-- a start -->A<!-- a end --><!-- b start -->B<!-- b end -->"
+    )
+    assert len(loops) == 1
+
+
+def test_identical_invocations_run_once():
+    content = (
+        "<!-- a start --><!-- a end --> <!-- a start --><!-- a end --> "
+        "<!-- b start --><!-- b end -->"
+    )
+    sections = {
+        "a": {"plugin": "random_choice", "options": ["x"], "inline": True},
+        "b": {
+            "plugin": "random_choice",
+            "options": ["x"],
+            "inline": True,
+            "prepend_text": "> ",
+        },
+    }
+    for jobs in (1, 2):
+        with patch(
+            "doteki.plugins.random_choice.run", return_value="quote"
+        ) as mock_run:
+            updated_content = process_sections(
+                {"sections": sections, "jobs": jobs}, content
+            )
+        mock_run.assert_called_once()
+        assert updated_content == (
+            "<!-- a start -->quote<!-- a end --> <!-- a start -->quote<!-- a end --> "
+            "<!-- b start -->> quote<!-- b end -->"
+        )
+
+
+def test_memoize_opt_out_runs_every_invocation():
+    content = "<!-- a start --><!-- a end --><!-- a start --><!-- a end -->"
+    sections = {"a": {"plugin": "random_choice", "options": ["x"], "memoize": False}}
+    with patch("doteki.plugins.random_choice.run", return_value="quote") as mock_run:
+        process_sections({"sections": sections}, content)
+    assert mock_run.call_count == 2
+
+
+def test_different_settings_are_not_shared():
+    content = "<!-- a start --><!-- a end --><!-- b start --><!-- b end -->"
+    sections = {
+        "a": {"plugin": "random_choice", "options": ["x"]},
+        "b": {"plugin": "random_choice", "options": ["y"]},
+    }
+    with patch("doteki.plugins.random_choice.run", return_value="quote") as mock_run:
+        process_sections({"sections": sections}, content)
+    assert mock_run.call_count == 2
+
+
+@pytest.mark.parametrize(
+    "setting",
+    [{"timeout": 0.1}, {"executor": "process"}, {"cache_ttl": "1h"}],
+)
+def test_sections_with_different_execution_settings_are_not_shared(setting):
+    content = "<!-- a start --><!-- a end --><!-- b start --><!-- b end -->"
+    sections = {
+        "a": {"plugin": "random_choice", "options": ["x"], **setting},
+        "b": {"plugin": "random_choice", "options": ["x"]},
+    }
+    run_context = RunContext({"sections": sections})
+    with patch("doteki.cli.run_cached_plugin", return_value="quote") as mock_run:
+        process_sections({"sections": sections}, content, run_context)
+    run_context.runner.close()
+    assert mock_run.call_count == 2
+
+
+def test_invocation_key_is_canonical():
+    key = invocation_key("feed", {"url": "https://example.com", "n": 3})
+    assert key == invocation_key("feed", {"n": 3, "url": "https://example.com"})
+    assert key == invocation_key(
+        "feed",
+        {"url": "https://example.com", "n": 3, "inline": True, "preset": "space"},
+    )
+    assert key != invocation_key("feed", {"url": "https://example.com", "n": 4})
+    assert key != invocation_key("lastfm", {"url": "https://example.com", "n": 3})
+
+
+def test_cache_serves_fresh_entries_without_running_plugin(tmp_path, caplog):
+    content = "<!-- a start --><!-- a end -->"
+    global_config = {
+        "cache_dir": str(tmp_path),
+        "cache_ttl": "1h",
+        "sections": {
+            "a": {"plugin": "random_choice", "options": ["x"], "inline": True}
+        },
+    }
+    with patch("doteki.plugins.random_choice.run", return_value="first") as mock_run:
+        with caplog.at_level(logging.INFO):
+            assert "first" in process_sections(global_config, content)
+        assert "Cache: 0 hits, 1 misses" in caplog.text
+        caplog.clear()
+        mock_run.return_value = "second"
+        with caplog.at_level(logging.INFO):
+            assert "first" in process_sections(global_config, content)
+        assert "Cache: 1 hits, 0 misses" in caplog.text
+    mock_run.assert_called_once()
+
+
+def test_cache_refreshes_expired_entries(tmp_path):
+    content = "<!-- a start --><!-- a end -->"
+    global_config = {
+        "cache_dir": str(tmp_path),
+        "cache_ttl": "1h",
+        "sections": {
+            "a": {
+                "plugin": "random_choice",
+                "options": ["x"],
+                "inline": True,
+                "cache_ttl": "1s",
+            }
+        },
+    }
+    with patch("doteki.plugins.random_choice.run", return_value="first"):
+        process_sections(global_config, content)
+    with patch("doteki.plugins.random_choice.run", return_value="second"), patch(
+        "doteki.cache.time.time", return_value=time.time() + 5
+    ):
+        assert "second" in process_sections(global_config, content)
+
+
+def test_cache_is_disabled_by_default(tmp_path):
+    content = "<!-- a start --><!-- a end -->"
+    global_config = {
+        "cache_dir": str(tmp_path),
+        "sections": {"a": {"plugin": "random_choice", "options": ["x"]}},
+    }
+    with patch("doteki.plugins.random_choice.run", return_value="x") as mock_run:
+        process_sections(global_config, content)
+        process_sections(global_config, content)
+    assert mock_run.call_count == 2
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_invalid_cache_ttl(tmp_path, caplog):
+    content = "<!-- a start --><!-- a end -->"
+    global_config = {
+        "cache_dir": str(tmp_path),
+        "sections": {
+            "a": {"plugin": "random_choice", "options": ["x"], "cache_ttl": "soon"}
+        },
+    }
+    with patch("doteki.plugins.random_choice.run", return_value="x"):
+        assert "x" in process_sections(global_config, content)
+    assert "Invalid value for cache_ttl" in caplog.text
+
+
+def seed_cache(cache_dir, settings, output, age):
+    key = cache_key("random_choice", invocation_key("random_choice", settings))
+    with patch("doteki.cache.time.time", return_value=time.time() - age):
+        OutputCache(str(cache_dir)).set(key, "random_choice", output)
+    return key
+
+
+def test_failed_plugin_serves_last_successful_output(tmp_path, caplog):
+    settings = {"plugin": "random_choice", "options": ["x"], "inline": True}
+    seed_cache(tmp_path, settings, "last good", age=3600)
+    global_config = {
+        "cache_dir": str(tmp_path),
+        "max_staleness": "1d",
+        "sections": {"a": settings},
+    }
+    with patch("doteki.plugins.random_choice.run", return_value=None):
+        updated_content = process_sections(
+            global_config, "<!-- a start -->old<!-- a end -->"
+        )
+    assert updated_content == "<!-- a start -->last good<!-- a end -->"
+    assert "Serving the last successful output, from 1h ago" in caplog.text
+
+
+def test_failed_plugin_does_not_serve_output_past_max_staleness(tmp_path):
+    settings = {"plugin": "random_choice", "options": ["x"], "inline": True}
+    seed_cache(tmp_path, settings, "too old", age=7200)
+    global_config = {
+        "cache_dir": str(tmp_path),
+        "max_staleness": "1h",
+        "sections": {"a": settings},
+    }
+    with patch("doteki.plugins.random_choice.run", return_value=None):
+        updated_content = process_sections(
+            global_config, "<!-- a start -->old<!-- a end -->"
+        )
+    assert updated_content == "<!-- a start -->old<!-- a end -->"
+
+
+def test_successful_runs_are_kept_for_fallback(tmp_path):
+    settings = {"plugin": "random_choice", "options": ["x"], "inline": True}
+    global_config = {
+        "cache_dir": str(tmp_path),
+        "max_staleness": "1d",
+        "sections": {"a": settings},
+    }
+    content = "<!-- a start --><!-- a end -->"
+    with patch("doteki.plugins.random_choice.run", return_value="fresh"):
+        process_sections(global_config, content)
+    with patch("doteki.plugins.random_choice.run", return_value=None):
+        assert "fresh" in process_sections(global_config, content)
+
+
+def test_stale_while_revalidate_serves_stale_and_refreshes(tmp_path):
+    settings = {"plugin": "random_choice", "options": ["x"], "inline": True}
+    key = seed_cache(tmp_path, settings, "stale", age=7200)
+    global_config = {
+        "cache_dir": str(tmp_path),
+        "cache_ttl": "1h",
+        "max_staleness": "1d",
+        "stale_while_revalidate": True,
+        "sections": {"a": settings},
+    }
+    with patch("doteki.plugins.random_choice.run", return_value="fresh"):
+        updated_content = process_sections(
+            global_config, "<!-- a start --><!-- a end -->"
+        )
+    assert updated_content == "<!-- a start -->stale<!-- a end -->"
+    assert OutputCache(str(tmp_path)).get(key).output == "fresh"
+
+
+def test_main_writes_before_background_refresh_finishes(tmp_path):
+    readme_file = tmp_path / "README.md"
+    config_file = tmp_path / "config.toml"
+    readme_file.write_text("<!-- a start --><!-- a end -->", encoding="utf-8")
+    config_file.write_text(
+        f"""
+    cache_dir = "{tmp_path / 'cache'}"
+    cache_ttl = "1h"
+    max_staleness = "1d"
+    stale_while_revalidate = true
+    credits = ""
+    [sections.a]
+    plugin = "random_choice"
+    options = ["x"]
+    inline = true
+    """,
+        encoding="utf-8",
+    )
+    seed_cache(
+        tmp_path / "cache",
+        {"plugin": "random_choice", "options": ["x"], "inline": True},
+        "stale",
+        age=7200,
+    )
+    written = threading.Event()
+
+    def slow_refresh(settings):
+        # Only finishes once the README has been written.
+        assert written.wait(timeout=5)
+        return "fresh"
+
+    def write_and_signal(filepath, content):
+        written.set()
+        return True
+
+    test_args = ["doteki", "-c", str(config_file), "-i", str(readme_file)]
+    with patch.object(sys, "argv", test_args), patch(
+        "doteki.plugins.random_choice.run", slow_refresh
+    ), patch(
+        "doteki.cli.write_file_content", side_effect=write_and_signal
+    ) as mock_write:
+        main()
+
+    assert mock_write.call_args.args[1] == "<!-- a start -->stale<!-- a end -->"
+
+
+def hanging_plugin(release):
+    def run(settings):
+        if settings["options"][0] == "hang":
+            release.wait(timeout=5)
+        return settings["options"][0]
+
+    return run
+
+
+def test_section_timeout_keeps_existing_content(caplog):
+    release = threading.Event()
+    sections = {
+        "a": {"plugin": "random_choice", "options": ["hang"], "timeout": 0.1},
+    }
+    content = "<!-- a start -->old<!-- a end -->"
+    with patch("doteki.plugins.random_choice.run", hanging_plugin(release)):
+        updated_content = process_sections({"sections": sections}, content)
+    release.set()
+    assert updated_content == content
+    assert "Plugin 'random_choice' timed out after 0.1s" in caplog.text
+    assert "1 plugins timed out" in caplog.text
+
+
+def test_timed_out_plugin_falls_back_to_stale_output(tmp_path):
+    release = threading.Event()
+    settings = {"plugin": "random_choice", "options": ["hang"], "inline": True}
+    seed_cache(tmp_path, settings, "last good", age=60)
+    global_config = {
+        "cache_dir": str(tmp_path),
+        "timeout": "0.1s",
+        "max_staleness": "1h",
+        "sections": {"a": settings},
+    }
+    with patch("doteki.plugins.random_choice.run", hanging_plugin(release)):
+        updated_content = process_sections(
+            global_config, "<!-- a start --><!-- a end -->"
+        )
+    release.set()
+    assert updated_content == "<!-- a start -->last good<!-- a end -->"
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_deadline_keeps_finished_sections(jobs, caplog):
+    release = threading.Event()
+    sections = {
+        "a": {"plugin": "random_choice", "options": ["done"], "inline": True},
+        "b": {"plugin": "random_choice", "options": ["hang"], "inline": True},
+        "c": {"plugin": "random_choice", "options": ["late"], "inline": True},
+    }
+    content = (
+        "<!-- a start --><!-- a end -->"
+        "<!-- b start -->old<!-- b end -->"
+        "<!-- c start -->old<!-- c end -->"
+    )
+    global_config = {"sections": sections, "deadline": 0.2, "jobs": jobs}
+    with patch("doteki.plugins.random_choice.run", hanging_plugin(release)):
+        updated_content = process_sections(global_config, content)
+    release.set()
+    assert updated_content.startswith("<!-- a start -->done<!-- a end -->")
+    assert "<!-- b start -->old<!-- b end -->" in updated_content
+    assert "Run deadline of 0.2s reached. Abandoned sections: b" in caplog.text
+    if jobs == 1:
+        assert "<!-- c start -->old<!-- c end -->" in updated_content
+        assert "Abandoned sections: b, c" in caplog.text
+
+
+def test_sections_run_by_priority():
+    order = []
+
+    def run(settings):
+        order.append(settings["options"][0])
+        return settings["options"][0]
+
+    sections = {
+        "a": {"plugin": "random_choice", "options": ["a"]},
+        "b": {"plugin": "random_choice", "options": ["b"], "priority": 10},
+        "c": {"plugin": "random_choice", "options": ["c"], "priority": -1},
+        "d": {"plugin": "random_choice", "options": ["d"]},
+    }
+    content = "".join(f"<!-- {name} start --><!-- {name} end -->" for name in "abcd")
+    with patch("doteki.plugins.random_choice.run", run):
+        process_sections({"sections": sections}, content)
+    assert order == ["b", "a", "d", "c"]
+
+
+def test_invalid_priority(caplog):
+    sections = {"a": {"plugin": "random_choice", "options": ["a"], "priority": "1"}}
+    process_sections({"sections": sections}, "<!-- a start --><!-- a end -->")
+    assert "Invalid value for priority in section 'a': '1'" in caplog.text
+
+
+@pytest.mark.parametrize("deadline, expected", [("90", 90), ("1m30s", 90)])
+def test_main_deadline_argument(deadline, expected, tmp_path):
+    readme_file = tmp_path / "README.md"
+    config_file = tmp_path / "config.toml"
+    readme_file.write_text("", encoding="utf-8")
+    config_file.write_text("[sections]", encoding="utf-8")
+
+    test_args = ["doteki", "-c", str(config_file), "-i", str(readme_file)]
+    with patch.object(sys, "argv", test_args + ["--deadline", deadline]), patch(
+        "doteki.cli.process_sections", return_value=""
+    ) as mock_process_sections:
+        main()
+
+    assert mock_process_sections.call_args.args[0]["deadline"] == expected
+
+
+def test_main_invalid_deadline_argument():
+    test_args = ["doteki", "--deadline", "soon"]
+    with patch.object(sys, "argv", test_args), pytest.raises(SystemExit):
+        main()
+
+
+def test_circuit_breaker_skips_failing_endpoint(tmp_path, caplog):
+    sections = {
+        "a": {"plugin": "feed", "url": "https://example.com/feed.xml", "inline": True}
+    }
+    global_config = {
+        "cache_dir": str(tmp_path),
+        "breaker_threshold": 2,
+        "breaker_cooldown": "1h",
+        "sections": sections,
+    }
+    content = "<!-- a start -->old<!-- a end -->"
+    with patch("doteki.plugins.feed.run", return_value=None) as mock_run:
+        for _ in range(3):
+            assert process_sections(global_config, content) == content
+    assert mock_run.call_count == 2
+    assert (
+        "Skipping plugin 'feed' for https://example.com/feed.xml after 2 consecutive failures. Retrying in 1h"
+        in caplog.text
+    )
+    assert (
+        "Circuit breaker for 'feed' (https://example.com/feed.xml) is open"
+        in caplog.text
+    )
+
+    # Once the cooldown has passed, a successful call closes the breaker.
+    with patch("doteki.breaker.time.time", return_value=time.time() + 3601), patch(
+        "doteki.plugins.feed.run", return_value="new"
+    ):
+        updated_content = process_sections(global_config, content)
+    assert updated_content == "<!-- a start -->new<!-- a end -->"
+    assert not (tmp_path / "breakers.json").read_text(encoding="utf-8").strip("{}")
+
+
+def test_circuit_breaker_disabled_by_default(tmp_path):
+    sections = {"a": {"plugin": "feed", "url": "https://example.com/feed.xml"}}
+    global_config = {"cache_dir": str(tmp_path), "sections": sections}
+    with patch("doteki.plugins.feed.run", return_value=None) as mock_run:
+        for _ in range(6):
+            process_sections(global_config, "<!-- a start --><!-- a end -->")
+    assert mock_run.call_count == 6
+    assert not (tmp_path / "breakers.json").exists()
+
+
+def test_invalid_breaker_threshold(caplog):
+    sections = {
+        "a": {"plugin": "random_choice", "options": ["a"], "breaker_threshold": "5"}
+    }
+    process_sections({"sections": sections}, "<!-- a start --><!-- a end -->")
+    assert "Invalid value for breaker_threshold: '5'" in caplog.text
+
+
+def test_http_cache_settings(tmp_path, caplog):
+    run_context = RunContext({"cache_dir": str(tmp_path), "http_cache_size": 1})
+    assert run_context.http.cache.max_bytes == 1024 * 1024
+    assert RunContext({"http_cache_size": 0}).http.cache is None
+    RunContext({"http_cache_size": "1MB", "http_cache_max_age": "forever"})
+    assert "Invalid value for http_cache_size: '1MB'" in caplog.text
+    assert "Invalid value for http_cache_max_age" in caplog.text
+
+
+@pytest.fixture
+def dated_readme(tmp_path):
+    readme_file = tmp_path / "README.md"
+    config_file = tmp_path / "config.toml"
+    readme_file.write_text("<!-- a start -->old<!-- a end -->", encoding="utf-8")
+    config_file.write_text(
+        """
+    credits = ""
+    [sections.a]
+    plugin = "current_date"
+    inline = true
+    """,
+        encoding="utf-8",
+    )
+    args = ["doteki", "-c", str(config_file), "-i", str(readme_file)]
+    with patch("doteki.plugins.current_date.run", return_value="2053-12-31"):
+        yield readme_file, args
+
+
+def test_main_skips_write_when_nothing_changed(dated_readme, caplog):
+    readme_file, args = dated_readme
+    with patch.object(sys, "argv", args):
+        main()
+    assert "2053-12-31" in readme_file.read_text(encoding="utf-8")
+
+    with caplog.at_level(logging.INFO), patch.object(sys, "argv", args), patch(
+        "doteki.cli.write_file_content"
+    ) as mock_write:
+        main()
+    mock_write.assert_not_called()
+    assert f"No changes to {readme_file}" in caplog.text
+
+
+def test_main_check_fails_when_readme_would_change(dated_readme, caplog):
+    readme_file, args = dated_readme
+    with caplog.at_level(logging.INFO), patch.object(
+        sys, "argv", args + ["--check"]
+    ), pytest.raises(SystemExit) as exit_info:
+        main()
+    assert exit_info.value.code == 1
+    assert f"{readme_file} would change" in caplog.text
+    assert readme_file.read_text(encoding="utf-8") == (
+        "<!-- a start -->old<!-- a end -->"
+    )
+
+
+def test_main_check_passes_when_readme_is_up_to_date(dated_readme, caplog):
+    readme_file, args = dated_readme
+    readme_file.write_text("<!-- a start -->2053-12-31<!-- a end -->\n\n")
+    with caplog.at_level(logging.INFO), patch.object(
+        sys, "argv", args + ["--check"]
+    ), patch("doteki.cli.write_file_content") as mock_write:
+        main()
+    mock_write.assert_not_called()
+    assert f"{readme_file} is up to date" in caplog.text
+
+
+@pytest.fixture
+def stateful_readme(tmp_path):
+    readme_file = tmp_path / "README.md"
+    config_file = tmp_path / "config.toml"
+    readme_file.write_text(
+        "<!-- a start --><!-- a end -->\n<!-- b start --><!-- b end -->",
+        encoding="utf-8",
+    )
+    config = f"""
+    credits = ""
+    state_file = "{tmp_path / 'state.json'}"
+    [sections.a]
+    plugin = "random_choice"
+    options = ["a"]
+    refresh = "1h"
+    [sections.b]
+    plugin = "random_choice"
+    options = ["b"]
+    """
+    config_file.write_text(config, encoding="utf-8")
+    args = ["doteki", "-c", str(config_file), "-i", str(readme_file)]
+    return readme_file, config_file, args
+
+
+def run_main(args):
+    ran = []
+
+    def run(settings):
+        ran.append(settings["options"][0])
+        return settings["options"][0]
+
+    with patch.object(sys, "argv", args), patch(
+        "doteki.plugins.random_choice.run", run
+    ):
+        main()
+    return ran
+
+
+def test_only_stale_runs_sections_that_need_it(stateful_readme, caplog):
+    readme_file, config_file, args = stateful_readme
+    assert run_main(args) == ["a", "b"]
+
+    with caplog.at_level(logging.INFO):
+        # Section b has no refresh interval, so it always runs.
+        assert run_main(args + ["--only-stale"]) == ["b"]
+    assert "Skipping section 'a': it's up to date" in caplog.text
+    assert "Running section 'b': it has no refresh interval" in caplog.text
+
+    readme_file.write_text(
+        readme_file.read_text(encoding="utf-8").replace("\na\n", "\nedited\n"),
+        encoding="utf-8",
+    )
+    assert run_main(args + ["--only-stale"]) == ["a", "b"]
+
+    config_file.write_text(
+        config_file.read_text(encoding="utf-8").replace('["a"]', '["c"]'),
+        encoding="utf-8",
+    )
+    assert run_main(args + ["--only-stale"]) == ["c", "b"]
+    assert readme_file.read_text(encoding="utf-8") == (
+        "<!-- a start -->\nc\n<!-- a end -->\n<!-- b start -->\nb\n<!-- b end -->"
+    )
+
+    with patch("time.time", return_value=time.time() + 3600):
+        assert run_main(args + ["--only-stale"]) == ["c", "b"]
+
+
+def test_only_stale_reruns_failed_sections(stateful_readme):
+    readme_file, _, args = stateful_readme
+    with patch.object(sys, "argv", args), patch(
+        "doteki.plugins.random_choice.run", return_value=None
+    ):
+        main()
+    assert run_main(args + ["--only-stale"]) == ["a", "b"]
+
+
+def test_state_is_not_saved_when_the_write_fails(stateful_readme, tmp_path):
+    _, _, args = stateful_readme
+    with patch("doteki.cli.write_file_content", return_value=False), pytest.raises(
+        SystemExit
+    ):
+        run_main(args)
+    assert not (tmp_path / "state.json").exists()
+
+
+class ScriptedWatcher:
+    # Stands in for FileWatcher: each wait() applies the next edit and reports
+    # the files it touched. Stops the watch once the script runs out.
+    def __init__(self, script):
+        self.script = list(script)
+        self.closed = False
+
+    def wait(self, timeout=None):
+        if not self.script:
+            raise KeyboardInterrupt
+        return self.script.pop(0)()
+
+    def close(self):
+        self.closed = True
+
+
+def run_watch(args, script, ran):
+    def run(settings):
+        ran.append(settings["options"][0])
+        return settings["options"][0]
+
+    watcher = ScriptedWatcher(script)
+    with patch.object(sys, "argv", args + ["--watch"]), patch(
+        "doteki.cli.FileWatcher", return_value=watcher
+    ), patch("doteki.plugins.random_choice.run", run), patch(
+        "doteki.cli.get_http_client", wraps=get_http_client
+    ) as mock_get_http_client:
+        main()
+    assert watcher.closed
+    return mock_get_http_client
+
+
+def edit(path, old, new):
+    def apply():
+        path.write_text(
+            path.read_text(encoding="utf-8").replace(old, new), encoding="utf-8"
+        )
+        return {str(path)}
+
+    return apply
+
+
+def test_watch_rerenders_only_changed_sections(stateful_readme, caplog):
+    readme_file, config_file, args = stateful_readme
+    ran = []
+    snapshots = []
+
+    def snapshot():
+        snapshots.append(list(ran))
+        return set()
+
+    script = [
+        # Our own write shows up as a change, and is ignored.
+        lambda: {str(readme_file)},
+        snapshot,
+        edit(config_file, '["a"]', '["c"]'),
+        snapshot,
+        edit(readme_file, "\nb\n", "\nedited\n"),
+        snapshot,
+        edit(config_file, 'credits = ""', 'credits = ""\njobs = 2'),
+    ]
+    with caplog.at_level(logging.INFO):
+        mock_get_http_client = run_watch(args, script, ran)
+
+    assert snapshots == [["a", "b"], ["a", "b", "c"], ["a", "b", "c", "b"]]
+    # A global setting changed, so nothing needed to run again.
+    assert ran == ["a", "b", "c", "b"]
+    assert mock_get_http_client.call_count == 2
+    assert readme_file.read_text(encoding="utf-8") == (
+        "<!-- a start -->\nc\n<!-- a end -->\n<!-- b start -->\nb\n<!-- b end -->"
+    )
+    assert "Stopped watching" in caplog.text
+
+
+def test_watch_keeps_going_after_an_invalid_config(stateful_readme, caplog):
+    readme_file, config_file, args = stateful_readme
+    ran = []
+    script = [
+        edit(config_file, "[sections.a]", "[sections.a"),
+        edit(config_file, "[sections.a", "[sections.a]"),
+    ]
+    with caplog.at_level(logging.ERROR):
+        run_watch(args, script, ran)
+    assert "Error parsing TOML file" in caplog.text
+    # The fixed config matches the last render, so nothing runs again.
+    assert ran == ["a", "b"]
+
+
+def test_without_sections():
+    config = {"jobs": 2, "sections": {"a": {"plugin": "figlet"}}}
+    assert without_sections(config) == {"jobs": 2}
+
+
+def test_read_config_returns_none_on_errors(tmp_path, caplog):
+    with caplog.at_level(logging.ERROR):
+        assert read_config(str(tmp_path / "missing.toml")) is None
+    assert "An error occurred while reading" in caplog.text
+
+
+@pytest.mark.parametrize(
+    "global_config, track_state, expected",
+    [
+        ({"sections": {"a": {"plugin": "figlet"}}}, False, False),
+        ({"sections": {"a": {"plugin": "figlet"}}}, True, True),
+        ({"sections": {"a": {"plugin": "figlet", "refresh": "1h"}}}, False, True),
+        ({"refresh": "1h", "sections": {}}, False, True),
+        ({"only_stale": True, "sections": {}}, False, True),
+    ],
+)
+def test_run_state_is_only_kept_when_used(global_config, track_state, expected):
+    run_context = RunContext(global_config, "README.md", track_state=track_state)
+    run_context.runner.close()
+    assert (run_context.state is not None) == expected
+
+
+def test_main_check_leaves_caches_and_breakers_alone(tmp_path):
+    readme_file = tmp_path / "README.md"
+    config_file = tmp_path / "config.toml"
+    cache_dir = tmp_path / "cache"
+    readme_file.write_text(
+        "<!-- ok start --><!-- ok end --><!-- broken start --><!-- broken end -->",
+        encoding="utf-8",
+    )
+    config_file.write_text(
+        f"""
+        cache_dir = "{cache_dir}"
+        cache_ttl = "1h"
+        breaker_threshold = 1
+        [sections.ok]
+        plugin = "random_choice"
+        options = ["x"]
+        [sections.broken]
+        plugin = "random_choice"
+        options = []
+        """,
+        encoding="utf-8",
+    )
+    args = ["doteki", "-c", str(config_file), "-i", str(readme_file), "--check"]
+    with patch.object(sys, "argv", args), pytest.raises(SystemExit):
+        main()
+    assert not cache_dir.exists()
+
+
+def test_check_serves_stale_outputs_without_refreshing(tmp_path, caplog):
+    settings = {"plugin": "random_choice", "options": ["x"], "inline": True}
+    seed_cache(tmp_path, settings, "stale", age=3600)
+    global_config = {
+        "cache_dir": str(tmp_path),
+        "cache_ttl": "1m",
+        "max_staleness": "1d",
+        "stale_while_revalidate": True,
+        "sections": {"a": settings},
+    }
+    run_context = RunContext(global_config, read_only=True)
+    with caplog.at_level(logging.INFO), patch(
+        "doteki.plugins.random_choice.run"
+    ) as mock_run:
+        content = process_sections(
+            global_config, "<!-- a start --><!-- a end -->", run_context
+        )
+        finish_run(run_context)
+    mock_run.assert_not_called()
+    assert content == "<!-- a start -->stale<!-- a end -->"
+    assert "while it refreshes" not in caplog.text
+
+
+def test_plugin_endpoint_does_not_import_process_executor_plugins():
+    settings = {"url": "https://example.com/atom.xml", "executor": "process"}
+    with patch("importlib.import_module") as mock_import:
+        endpoint = get_plugin_endpoint("feed", settings)
+    mock_import.assert_not_called()
+    assert endpoint == invocation_key("feed", settings)
+    assert get_plugin_endpoint("feed", {"url": settings["url"]}) == settings["url"]
+
+
+@pytest.mark.parametrize("value, expected", [("90", 90), ("1.5", 1.5), ("2m", 120)])
+def test_deadline_argument(value, expected):
+    with patch.object(sys, "argv", ["doteki", "--deadline", value]):
+        assert parse_arguments().deadline == expected
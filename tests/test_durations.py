@@ -0,0 +1,56 @@
+import pytest
+
+from doteki.durations import format_duration, parse_duration, parse_seconds
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        (0, 0),
+        (90, 90),
+        (1.5, 1.5),
+        ("30s", 30),
+        ("15m", 900),
+        ("1h", 3600),
+        ("1h30m", 5400),
+        ("7d", 604800),
+        ("2w", 1209600),
+        ("0.5h", 1800),
+    ],
+)
+def test_parse_duration(value, expected):
+    assert parse_duration(value) == expected
+
+
+@pytest.mark.parametrize("value", ["", "1", "1y", "h", "1h 30m", "-5m", -1, True, None])
+def test_parse_duration_invalid(value):
+    with pytest.raises(ValueError):
+        parse_duration(value)
+
+
+@pytest.mark.parametrize(
+    "seconds, expected",
+    [
+        (5, "5s"),
+        (90, "2m"),
+        (3600, "1h"),
+        (3599.9, "1h"),
+        (86400 * 3, "3d"),
+        (604800 * 2, "2w"),
+    ],
+)
+def test_format_duration(seconds, expected):
+    assert format_duration(seconds) == expected
+
+
+@pytest.mark.parametrize(
+    "value, expected", [("90", 90), ("1.5", 1.5), ("2m", 120), (0.25, 0.25)]
+)
+def test_parse_seconds(value, expected):
+    assert parse_seconds(value) == expected
+
+
+@pytest.mark.parametrize("value", ["", "1.", ".5", "-1", "1.5.2", "1 s"])
+def test_parse_seconds_invalid(value):
+    with pytest.raises(ValueError):
+        parse_seconds(value)
@@ -0,0 +1,295 @@
+import logging
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+
+from doteki import http
+from doteki.cli import process_sections
+from doteki.cache import HttpCache
+from doteki.http import DEFAULT_TIMEOUT, HttpClient, create_session
+
+
+def mock_response(status_code=200, content=b"data", headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.content = content
+    response.headers = headers or {}
+    return response
+
+
+@pytest.fixture(autouse=True)
+def mock_sleep():
+    with patch("time.sleep") as mock_sleep:
+        yield mock_sleep
+
+
+@pytest.fixture
+def client():
+    client = HttpClient(retries=2)
+    client._session = MagicMock()
+    return client
+
+
+def test_get_uses_default_timeout(client):
+    client._session.get.return_value = mock_response()
+    client.get("https://example.com/feed.xml")
+    client.get("https://example.com/feed.xml", timeout=1)
+    timeouts = [call.kwargs["timeout"] for call in client._session.get.call_args_list]
+    assert timeouts == [DEFAULT_TIMEOUT, 1]
+
+
+def test_get_retries_server_errors(client, mock_sleep):
+    client._session.get.side_effect = [mock_response(503), mock_response(200)]
+    response = client.get("https://example.com/feed.xml")
+    assert response.status_code == 200
+    assert client.stats["retries"] == 1
+    assert mock_sleep.call_count == 1
+
+
+def test_get_returns_last_response_after_retries(client):
+    client._session.get.return_value = mock_response(500)
+    assert client.get("https://example.com/feed.xml").status_code == 500
+    assert client._session.get.call_count == 3
+
+
+def test_get_does_not_retry_client_errors(client):
+    client._session.get.return_value = mock_response(404)
+    assert client.get("https://example.com/feed.xml").status_code == 404
+    assert client._session.get.call_count == 1
+
+
+def test_get_raises_after_retrying_connection_errors(client):
+    client._session.get.side_effect = requests.ConnectionError("refused")
+    with pytest.raises(requests.ConnectionError):
+        client.get("https://example.com/feed.xml")
+    assert client._session.get.call_count == 3
+
+
+def test_get_counts_requests_bytes_and_hosts(client):
+    client._session.get.return_value = mock_response(content=b"x" * 100)
+    client.get("https://example.com/a")
+    client.get("https://example.org/b")
+    assert client.stats["requests"] == 2
+    assert client.stats["bytes"] == 200
+    assert client.hosts == {"example.com", "example.org"}
+
+
+def test_backoff_delay_is_jittered_and_bounded():
+    client = HttpClient(backoff=1)
+    delays = [client.backoff_delay(2) for _ in range(50)]
+    assert all(0 <= delay <= 4 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_session_caps_connections_per_host():
+    session = create_session(3)
+    adapter = session.get_adapter("https://example.com")
+    assert adapter._pool_maxsize == 3
+    assert adapter._pool_block
+
+
+def test_module_get_uses_the_current_client():
+    run_client = MagicMock()
+    token = http.current_client.set(run_client)
+    try:
+        http.get("https://example.com")
+    finally:
+        http.current_client.reset(token)
+    run_client.get.assert_called_once_with("https://example.com")
+    assert http.client() is http.default_client
+
+
+def test_plugins_share_the_run_client(caplog):
+    clients = set()
+
+    def run(settings):
+        clients.add(http.client())
+        http.client().record("https://example.com/feed.xml", 0, 2048)
+        return "ok"
+
+    content = "<!-- a start --><!-- a end --><!-- b start --><!-- b end -->"
+    sections = {
+        "a": {"plugin": "random_choice", "options": ["a"]},
+        "b": {"plugin": "random_choice", "options": ["b"]},
+    }
+    with caplog.at_level(logging.INFO), patch("doteki.plugins.random_choice.run", run):
+        process_sections({"sections": sections, "jobs": 2}, content)
+    assert len(clients) == 1
+    assert http.default_client not in clients
+    assert (
+        "HTTP: 2 requests to 1 hosts (0 retries, 0 not modified, 0 shared), 4.0 KiB"
+        in caplog.text
+    )
+
+
+@pytest.fixture
+def cached_client(tmp_path):
+    client = HttpClient(cache=HttpCache(str(tmp_path), 1024 * 1024, 3600))
+    client._session = MagicMock()
+    return client
+
+
+def test_get_revalidates_cached_responses(cached_client):
+    headers = {"ETag": '"v1"', "Content-Type": "application/json; charset=utf-8"}
+    cached_client._session.get.side_effect = [
+        mock_response(content=b'{"a": 1}', headers=headers),
+        mock_response(304, content=b""),
+    ]
+    cached_client.get("https://example.com/api")
+    response = cached_client.get("https://example.com/api")
+
+    second_call = cached_client._session.get.call_args_list[1]
+    assert second_call.kwargs["headers"] == {"If-None-Match": '"v1"'}
+    assert response.status_code == 200
+    assert response.from_cache
+    assert response.json() == {"a": 1}
+    assert response.encoding == "utf-8"
+    assert cached_client.stats["not_modified"] == 1
+
+
+def test_get_sends_if_modified_since(cached_client):
+    headers = {"Last-Modified": "Wed, 21 Oct 2026 07:28:00 GMT"}
+    cached_client._session.get.return_value = mock_response(headers=headers)
+    cached_client.get("https://example.com/feed.xml")
+    cached_client.get("https://example.com/feed.xml")
+    second_call = cached_client._session.get.call_args_list[1]
+    assert second_call.kwargs["headers"] == {
+        "If-Modified-Since": "Wed, 21 Oct 2026 07:28:00 GMT"
+    }
+
+
+@pytest.mark.parametrize(
+    "headers", [{}, {"ETag": '"v1"', "Cache-Control": "private, no-store"}]
+)
+def test_get_does_not_cache_responses_without_validators(cached_client, headers):
+    cached_client._session.get.return_value = mock_response(headers=headers)
+    cached_client.get("https://example.com/feed.xml")
+    cached_client.get("https://example.com/feed.xml")
+    assert "headers" not in cached_client._session.get.call_args_list[1].kwargs
+
+
+def test_get_keeps_caller_validators(cached_client):
+    cached_client._session.get.return_value = mock_response(headers={"ETag": '"v1"'})
+    cached_client.get("https://example.com/feed.xml")
+    cached_client.get("https://example.com/feed.xml", headers={"If-None-Match": "x"})
+    second_call = cached_client._session.get.call_args_list[1]
+    assert second_call.kwargs["headers"] == {"If-None-Match": "x"}
+
+
+@pytest.fixture
+def run_client():
+    client = HttpClient(reuse_responses=True)
+    client._session = MagicMock()
+    client._session.get.return_value = mock_response()
+    return client
+
+
+def test_sequential_requests_share_one_response(run_client):
+    first = run_client.get("https://example.com/feed.xml")
+    second = run_client.get("https://example.com/feed.xml")
+    assert first is second
+    assert run_client._session.get.call_count == 1
+    assert run_client.stats["shared"] == 1
+    run_client.get("https://example.com/feed.xml", params={"page": 2})
+    assert run_client._session.get.call_count == 2
+
+
+def test_reset_forgets_responses_but_keeps_the_session(run_client):
+    session = run_client._session
+    run_client.get("https://example.com/feed.xml")
+    run_client.reset()
+    run_client.get("https://example.com/feed.xml")
+    assert session.get.call_count == 2
+    assert run_client._session is session
+    session.close.assert_not_called()
+
+
+def test_responses_are_not_reused_outside_a_run(client):
+    client._session.get.return_value = mock_response()
+    client.get("https://example.com/feed.xml")
+    client.get("https://example.com/feed.xml")
+    assert client._session.get.call_count == 2
+
+
+@pytest.mark.parametrize("reuse_responses", [True, False])
+def test_concurrent_requests_share_one_download(reuse_responses):
+    client = HttpClient(reuse_responses=reuse_responses)
+    client._session = MagicMock()
+    release = threading.Event()
+
+    def slow_get(url, **kwargs):
+        release.wait(timeout=5)
+        return mock_response()
+
+    client._session.get.side_effect = slow_get
+    responses = []
+    threads = [
+        threading.Thread(
+            target=lambda: responses.append(client.get("https://example.com/feed"))
+        )
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    # Wait for the other two callers to queue up (time.sleep is mocked).
+    for _ in range(500):
+        if client.stats["shared"] == 2:
+            break
+        release.wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert client._session.get.call_count == 1
+    assert len(responses) == 3 and len(set(map(id, responses))) == 1
+
+
+def test_failed_requests_are_retried_by_later_callers(run_client):
+    run_client.retries = 0
+    run_client._session.get.side_effect = [
+        requests.ConnectionError("refused"),
+        mock_response(),
+    ]
+    with pytest.raises(requests.ConnectionError):
+        run_client.get("https://example.com/feed.xml")
+    assert run_client.get("https://example.com/feed.xml").status_code == 200
+
+
+def test_parse_shares_results_for_the_same_body(run_client):
+    calls = []
+
+    def parser(content):
+        calls.append(content)
+        return {"parsed": content}
+
+    first = run_client.parse(mock_response(content=b"feed"), parser)
+    second = run_client.parse(mock_response(content=b"feed"), parser)
+    run_client.parse(mock_response(content=b"other"), parser)
+    assert first is second
+    assert calls == [b"feed", b"other"]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_sections_reading_the_same_feed_share_the_download(jobs, tmp_path, caplog):
+    session = MagicMock()
+    session.get.return_value = mock_response(
+        content=b"""<?xml version="1.0"?><rss version="2.0"><channel>
+        <item><title>One</title><link>https://example.com/1</link></item>
+        <item><title>Two</title><link>https://example.com/2</link></item>
+        </channel></rss>"""
+    )
+    sections = {
+        "a": {"plugin": "feed", "url": "https://example.com/rss", "n": 1},
+        "b": {"plugin": "feed", "url": "https://example.com/rss", "n": 2},
+    }
+    content = "<!-- a start --><!-- a end --><!-- b start --><!-- b end -->"
+    global_config = {"sections": sections, "jobs": jobs, "cache_dir": str(tmp_path)}
+    with caplog.at_level(logging.INFO), patch(
+        "doteki.http.create_session", return_value=session
+    ):
+        updated_content = process_sections(global_config, content)
+    assert session.get.call_count == 1
+    assert "[One](https://example.com/1)\n<!-- a end -->" in updated_content
+    assert "- [Two](https://example.com/2)" in updated_content
+    assert "2 shared" in caplog.text
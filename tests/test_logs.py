@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from doteki.cli import process_sections
+from doteki.logs import (
+    LOG_FORMAT,
+    PluginContextFilter,
+    buffered_logs,
+    flush_logs,
+    plugin_logging_context,
+)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def handler():
+    root_logger = logging.getLogger()
+    handler = ListHandler()
+    handler.addFilter(PluginContextFilter())
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    original_level = root_logger.level
+    root_logger.addHandler(handler)
+    root_logger.setLevel(logging.INFO)
+    yield handler
+    root_logger.removeHandler(handler)
+    root_logger.setLevel(original_level)
+
+
+def test_records_outside_plugins_are_attributed_to_doteki(handler):
+    logging.info("Hello")
+    assert handler.format(handler.records[0]) == "[dōteki] INFO: Hello"
+    assert handler.records[0].section == ""
+
+
+def test_plugin_logging_context_attributes_records(handler):
+    with plugin_logging_context("feed", "blog"):
+        logging.error("Error fetching the feed")
+    logging.error("Back to the main application")
+
+    plugin_record, main_record = handler.records
+    assert handler.format(plugin_record) == "[feed] ERROR: Error fetching the feed"
+    assert plugin_record.section == "blog"
+    assert main_record.plugin == "dōteki"
+
+
+def test_plugin_logging_context_does_not_leak_across_threads(handler):
+    entered = threading.Event()
+    release = threading.Event()
+
+    def run_plugin():
+        with plugin_logging_context("lastfm", "music"):
+            entered.set()
+            release.wait(timeout=5)
+
+    thread = threading.Thread(target=run_plugin)
+    thread.start()
+    entered.wait(timeout=5)
+    logging.info("Logged from the main thread")
+    release.set()
+    thread.join()
+
+    assert handler.records[0].plugin == "dōteki"
+
+
+def test_buffered_logs_are_held_until_flushed(handler):
+    second_handler = ListHandler()
+    second_handler.addFilter(PluginContextFilter())
+    logging.getLogger().addHandler(second_handler)
+    try:
+        with buffered_logs() as records:
+            with plugin_logging_context("figlet", "banner"):
+                logging.warning("Buffered")
+        assert handler.records == []
+        assert len(records) == 1
+
+        flush_logs(records)
+    finally:
+        logging.getLogger().removeHandler(second_handler)
+
+    assert [r.getMessage() for r in handler.records] == ["Buffered"]
+    assert [r.getMessage() for r in second_handler.records] == ["Buffered"]
+    assert handler.records[0].plugin == "figlet"
+
+
+def test_concurrent_sections_flush_logs_in_section_order(handler):
+    def log_option(settings):
+        option = settings["options"][0]
+        if option == "first":
+            # Finish after the second section to exercise the ordering.
+            second_done.wait(timeout=5)
+        logging.warning(f"Running {option}")
+        if option == "second":
+            second_done.set()
+        return option
+
+    second_done = threading.Event()
+    content = "<!-- a start --><!-- a end --><!-- b start --><!-- b end -->"
+    sections = {
+        "a": {"plugin": "random_choice", "options": ["first"]},
+        "b": {"plugin": "random_choice", "options": ["second"]},
+    }
+    with patch("doteki.plugins.random_choice.run", log_option):
+        process_sections({"sections": sections, "jobs": 2}, content)
+
+    assert [(r.getMessage(), r.section) for r in handler.records] == [
+        ("Running first", "a"),
+        ("Running second", "b"),
+    ]
+    assert all(record.plugin == "random_choice" for record in handler.records)
+
+
+def test_finished_sections_flush_logs_while_later_ones_run(handler):
+    def log_option(settings):
+        option = settings["options"][0]
+        logging.warning(f"Running {option}")
+        if option == "second":
+            # The first section is done, so its logs shouldn't wait for this one.
+            deadline = time.monotonic() + 5
+            while not handler.records and time.monotonic() < deadline:
+                time.sleep(0.01)
+            seen_while_running.extend(r.getMessage() for r in handler.records)
+        return option
+
+    seen_while_running = []
+    content = "<!-- a start --><!-- a end --><!-- b start --><!-- b end -->"
+    sections = {
+        "a": {"plugin": "random_choice", "options": ["first"]},
+        "b": {"plugin": "random_choice", "options": ["second"]},
+    }
+    with patch("doteki.plugins.random_choice.run", log_option):
+        process_sections({"sections": sections, "jobs": 2}, content)
+
+    assert seen_while_running == ["Running first"]
+    assert [r.getMessage() for r in handler.records] == [
+        "Running first",
+        "Running second",
+    ]
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import signal
+
+import pytest
+
+from doteki.cli import get_plugin_output
+from doteki.process_executor import (
+    PluginProcessError,
+    describe_exit,
+    raise_worker_error,
+    serializable_output,
+    validate_limits,
+)
+
+
+def test_process_executor_returns_plugin_output():
+    settings = {
+        "executor": "process",
+        "options": ["A", "B"],
+        "n": 2,
+        "preset": "comma_and",
+    }
+    output = asyncio.run(get_plugin_output("random_choice", settings))
+    assert output in ("A, and B", "B, and A")
+
+
+def test_process_executor_forwards_plugin_logs(caplog):
+    settings = {"executor": "process", "options": []}
+    with caplog.at_level(logging.ERROR):
+        assert asyncio.run(get_plugin_output("random_choice", settings)) is None
+    assert "No options provided for the Random Choice plugin" in caplog.text
+
+
+def test_process_executor_missing_plugin(caplog):
+    settings = {"executor": "process"}
+    with caplog.at_level(logging.ERROR):
+        assert asyncio.run(get_plugin_output("nonexistent", settings)) is None
+    assert "Missing dependency for plugin 'nonexistent'" in caplog.text
+
+
+def test_process_executor_kills_plugin_over_cpu_limit(caplog):
+    settings = {
+        "executor": "process",
+        "cpu_limit": 1,
+        "options": ["busy"],
+        "n": 100_000_000,
+        "with_replacement": True,
+    }
+    with caplog.at_level(logging.ERROR):
+        assert asyncio.run(get_plugin_output("random_choice", settings)) is None
+    assert "exceeding its CPU time limit" in caplog.text
+
+
+def test_invalid_executor(caplog):
+    with caplog.at_level(logging.ERROR):
+        output = asyncio.run(get_plugin_output("random_choice", {"executor": "gpu"}))
+    assert output is None
+    assert "Invalid executor 'gpu' for plugin 'random_choice'" in caplog.text
+
+
+@pytest.mark.parametrize(
+    "cpu_limit, memory_limit", [(0, 512), (10, "512"), (True, 512), (10, -1)]
+)
+def test_validate_limits_rejects_invalid_values(cpu_limit, memory_limit):
+    with pytest.raises(ValueError):
+        validate_limits(cpu_limit, memory_limit)
+
+
+def test_describe_exit():
+    assert "CPU time limit" in describe_exit(-signal.SIGXCPU)
+    assert describe_exit(-signal.SIGKILL) == "Plugin process was killed"
+    assert "exit code 1" in describe_exit(1)
+
+
+@pytest.mark.parametrize(
+    "error_type, expected_exception",
+    [
+        ("ImportError", ImportError),
+        ("AttributeError", AttributeError),
+        ("MemoryError", PluginProcessError),
+        ("ValueError", PluginProcessError),
+    ],
+)
+def test_raise_worker_error(error_type, expected_exception):
+    with pytest.raises(expected_exception):
+        raise_worker_error({"type": error_type, "message": "mocked error"})
+
+
+def test_serializable_output():
+    assert serializable_output(None) is None
+    assert serializable_output(42) == "42"
+    assert serializable_output([1, "two"]) == ["1", "two"]
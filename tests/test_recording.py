@@ -0,0 +1,176 @@
+import json
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+
+from doteki.cli import get_replay_latency, process_sections
+from doteki.http import HttpClient
+from doteki.recording import Recorder, Replayer, redact
+
+
+def mock_response(content=b"data", status_code=200, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.content = content
+    response.headers = headers or {}
+    return response
+
+
+def record(tmp_path, *responses):
+    client = HttpClient(retries=0, recorder=Recorder(str(tmp_path)))
+    client._session = MagicMock()
+    client._session.get.side_effect = responses
+    return client
+
+
+@patch.dict(os.environ, {"DOTEKI_LASTFM_API_KEY": "s3cr3t-key", "DOTEKI_X": "ab"})
+def test_redact():
+    assert redact("https://x/?user=a&api_key=abc&n=1") == (
+        "https://x/?user=a&api_key=REDACTED&n=1"
+    )
+    assert redact("https://x/?TOKEN=abc") == "https://x/?TOKEN=REDACTED"
+    assert redact("Error for s3cr3t-key") == "Error for REDACTED"
+    assert redact("tab") == "tab"
+
+
+@patch.dict(os.environ, {"DOTEKI_LASTFM_API_KEY": "s3cr3t-key"})
+def test_record_then_replay(tmp_path):
+    headers = {"Content-Type": "application/json", "Set-Cookie": "session=1"}
+    client = record(tmp_path, mock_response(b'{"key": "s3cr3t-key"}', 200, headers))
+    client.get("https://example.com/api?api_key=s3cr3t-key")
+    client.close()
+
+    recording = (tmp_path / "exchanges.jsonl").read_text(encoding="utf-8")
+    assert "s3cr3t-key" not in recording
+    assert "session=1" not in recording
+
+    replay_client = HttpClient(replayer=Replayer(str(tmp_path), latency=0))
+    replay_client._session = MagicMock()
+    response = replay_client.get("https://example.com/api?api_key=s3cr3t-key")
+    assert response.status_code == 200
+    assert response.json() == {"key": "REDACTED"}
+    assert response.headers["content-type"] == "application/json"
+    replay_client._session.get.assert_not_called()
+
+
+def test_replay_serves_responses_in_order(tmp_path):
+    client = record(tmp_path, mock_response(b"first"), mock_response(b"second"))
+    client.get("https://example.com/feed")
+    client.get("https://example.com/feed")
+    client.close()
+
+    replayer = Replayer(str(tmp_path), latency=0)
+    bodies = [replayer.get("https://example.com/feed").content for _ in range(3)]
+    assert bodies == [b"first", b"second", b"second"]
+
+
+def test_replay_records_errors_and_binary_bodies(tmp_path):
+    client = record(
+        tmp_path, requests.ReadTimeout("timed out"), mock_response(b"\xff\xfe")
+    )
+    with pytest.raises(requests.ReadTimeout):
+        client.get("https://example.com/slow")
+    client.get("https://example.com/image")
+    client.close()
+
+    replayer = Replayer(str(tmp_path), latency=0)
+    with pytest.raises(requests.ReadTimeout, match="timed out"):
+        replayer.get("https://example.com/slow")
+    assert replayer.get("https://example.com/image").content == b"\xff\xfe"
+
+
+def test_replay_unknown_url(tmp_path):
+    (tmp_path / "exchanges.jsonl").write_text("", encoding="utf-8")
+    with pytest.raises(requests.ConnectionError, match="No recorded response"):
+        Replayer(str(tmp_path)).get("https://example.com/new")
+
+
+@pytest.mark.parametrize("latency, expected_delay", [(None, 1.5), (0.2, 0.2)])
+def test_replay_latency(tmp_path, latency, expected_delay):
+    exchange = {"method": "GET", "url": "https://x/", "status": 200, "headers": {}}
+    exchange.update({"body": "", "elapsed": 1.5})
+    (tmp_path / "exchanges.jsonl").write_text(json.dumps(exchange), encoding="utf-8")
+    with patch("time.sleep") as mock_sleep:
+        Replayer(str(tmp_path), latency=latency).get("https://x/")
+    mock_sleep.assert_called_once_with(expected_delay)
+
+
+@pytest.mark.parametrize(
+    "value, expected", [(None, 0), ("recorded", None), ("0.5", 0.5), ("2s", 2)]
+)
+def test_get_replay_latency(value, expected):
+    global_config = {} if value is None else {"replay_latency": value}
+    assert get_replay_latency(global_config) == expected
+
+
+@patch.dict(os.environ, {"DOTEKI_LASTFM_API_KEY": "s3cr3t-key"})
+def test_replayed_run_matches_recorded_run(tmp_path):
+    body = json.dumps(
+        {"topartists": {"artist": [{"name": "Nina Simone", "url": "https://x"}]}}
+    ).encode()
+    session = MagicMock()
+    session.get.return_value = mock_response(body, 200, {})
+    session.get.return_value.json.return_value = json.loads(body)
+    sections = {"music": {"plugin": "lastfm", "username": "welpo", "inline": True}}
+    content = "<!-- music start --><!-- music end -->"
+    recorded_config = {"sections": sections, "record": str(tmp_path)}
+    with patch("doteki.http.create_session", return_value=session):
+        recorded = process_sections(recorded_config, content)
+
+    replay_config = {"sections": sections, "replay": str(tmp_path)}
+    with patch("doteki.http.create_session") as create_session:
+        replayed = process_sections(replay_config, content)
+    create_session.assert_not_called()
+    assert (
+        replayed
+        == recorded
+        == ("<!-- music start -->[Nina Simone](https://x)<!-- music end -->")
+    )
+
+
+ATOM_FEED = """<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <title>Blog</title>
+  <entry><title>Recorded post</title><link href="https://example.com/post"/></entry>
+</feed>"""
+
+
+def test_process_executor_plugins_are_replayed(tmp_path):
+    exchange = {
+        "method": "GET",
+        "url": "https://example.com/atom.xml",
+        "status": 200,
+        "headers": {"Content-Type": "application/atom+xml"},
+        "elapsed": 0,
+        "body": ATOM_FEED,
+    }
+    (tmp_path / "exchanges.jsonl").write_text(json.dumps(exchange) + "\n")
+    sections = {
+        "blog": {
+            "plugin": "feed",
+            "url": "https://example.com/atom.xml",
+            "executor": "process",
+            "inline": True,
+        }
+    }
+    content = "<!-- blog start --><!-- blog end -->"
+    with patch("doteki.http.create_session") as create_session:
+        replayed = process_sections(
+            {"sections": sections, "replay": str(tmp_path)}, content
+        )
+    create_session.assert_not_called()
+    assert "[Recorded post](https://example.com/post)" in replayed
+
+
+def test_process_executor_plugins_are_recorded(tmp_path):
+    # Nothing listens on the discard port, so the worker records a failure.
+    url = "http://127.0.0.1:9/atom.xml"
+    sections = {"blog": {"plugin": "feed", "url": url, "executor": "process"}}
+    content = "<!-- blog start --><!-- blog end -->"
+    process_sections({"sections": sections, "record": str(tmp_path)}, content)
+    lines = (tmp_path / "exchanges.jsonl").read_text().splitlines()
+    exchanges = [json.loads(line) for line in lines]
+    assert exchanges and all(exchange["url"] == url for exchange in exchanges)
+    assert exchanges[0]["error"] == "ConnectionError"
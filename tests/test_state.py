@@ -0,0 +1,73 @@
+from unittest.mock import patch
+
+from doteki.state import RunState, content_hash, settings_hash, state_path
+
+SETTINGS = {"plugin": "feed", "url": "https://example.com/feed.xml"}
+
+
+def test_state_path_is_per_document(tmp_path):
+    first = state_path(str(tmp_path), "README.md")
+    assert first == state_path(str(tmp_path), "./README.md")
+    assert first != state_path(str(tmp_path), "docs/README.md")
+
+
+def test_settings_hash_ignores_key_order():
+    reordered = {"url": SETTINGS["url"], "plugin": "feed"}
+    assert settings_hash(SETTINGS) == settings_hash(reordered)
+    assert settings_hash(SETTINGS) != settings_hash({**SETTINGS, "n": 3})
+
+
+def test_record_and_reload(tmp_path):
+    path = str(tmp_path / "state.json")
+    state = RunState(path)
+    with patch("time.time", return_value=1000):
+        state.record("blog", SETTINGS, ["\nposts\n"], True, 0.25)
+    state.record("blog", SETTINGS, ["\nposts\n"], False, 10)
+    state.save()
+
+    entry = RunState(path).sections["blog"]
+    assert entry == {
+        "last_success": 1000,
+        "last_duration": 10,
+        "settings_hash": settings_hash(SETTINGS),
+        "output_hash": content_hash(["\nposts\n"]),
+        "failures": 1,
+    }
+
+
+def test_stale_reasons(tmp_path):
+    state = RunState(str(tmp_path / "state.json"))
+    regions = ["\nposts\n"]
+    assert state.stale_reason("blog", SETTINGS, regions, 3600) == (
+        "it never ran successfully"
+    )
+    with patch("time.time", return_value=1000):
+        state.record("blog", SETTINGS, regions, True, 1)
+
+    with patch("time.time", return_value=1000 + 60):
+        assert state.stale_reason("blog", SETTINGS, regions, 3600) is None
+        assert state.stale_reason("blog", SETTINGS, regions, 0) == (
+            "it has no refresh interval"
+        )
+        assert state.stale_reason("blog", {**SETTINGS, "n": 1}, regions, 3600) == (
+            "its settings changed"
+        )
+        assert state.stale_reason("blog", SETTINGS, ["edited"], 3600) == (
+            "its content was edited"
+        )
+    with patch("time.time", return_value=1000 + 3600):
+        assert state.stale_reason("blog", SETTINGS, regions, 3600) == (
+            "its refresh interval elapsed"
+        )
+
+    state.record("blog", SETTINGS, regions, False, 1)
+    assert state.stale_reason("blog", SETTINGS, regions, 3600) == (
+        "it failed last time"
+    )
+
+
+def test_unreadable_state_is_ignored(tmp_path, caplog):
+    path = tmp_path / "state.json"
+    path.write_text("[]", encoding="utf-8")
+    assert RunState(str(path)).sections == {}
+    assert "Ignoring unreadable run state" in caplog.text
@@ -0,0 +1,63 @@
+import os
+import sys
+
+import pytest
+
+from doteki.watch import EVENT_HEADER, FileWatcher, Inotify
+
+
+@pytest.fixture
+def watched_file(tmp_path):
+    path = tmp_path / "README.md"
+    path.write_text("Hello", encoding="utf-8")
+    return str(path)
+
+
+def test_polling_detects_changes(watched_file):
+    watcher = FileWatcher([watched_file], poll_interval=0.01)
+    watcher.close()  # Fall back to polling.
+    assert watcher.wait(timeout=0.05) == set()
+    with open(watched_file, "w", encoding="utf-8") as file:
+        file.write("Hello, world")
+    assert watcher.wait(timeout=1) == {watched_file}
+    os.remove(watched_file)
+    assert watcher.wait(timeout=1) == {watched_file}
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Linux only")
+def test_inotify_detects_writes_and_renames(watched_file, tmp_path):
+    watcher = FileWatcher([watched_file])
+    assert watcher.inotify is not None
+    try:
+        # Other files in the same directory are ignored.
+        (tmp_path / "notes.txt").write_text("Unrelated", encoding="utf-8")
+        assert watcher.wait(timeout=0.2) == set()
+        with open(watched_file, "w", encoding="utf-8") as file:
+            file.write("Hello, world")
+        assert watcher.wait(timeout=1) == {watched_file}
+        # Editors often save to a temporary file and rename it over the original.
+        (tmp_path / "README.md.tmp").write_text("Saved", encoding="utf-8")
+        os.replace(tmp_path / "README.md.tmp", watched_file)
+        assert watcher.wait(timeout=1) == {watched_file}
+    finally:
+        watcher.close()
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Linux only")
+def test_inotify_parses_batched_events(watched_file, tmp_path):
+    config_file = str(tmp_path / "doteki.toml")
+    inotify = Inotify([watched_file, config_file])
+    try:
+        (descriptor,) = inotify.watches
+        read_fd, write_fd = os.pipe()
+        os.close(inotify.fd)
+        inotify.fd = read_fd
+        events = b""
+        for name in [b"doteki.toml", b"other.txt", b"README.md"]:
+            padded = name.ljust(16, b"\0")
+            events += EVENT_HEADER.pack(descriptor, 0x8, 0, len(padded)) + padded
+        os.write(write_fd, events)
+        os.close(write_fd)
+        assert inotify.read_events(timeout=1) == {watched_file, config_file}
+    finally:
+        inotify.close()